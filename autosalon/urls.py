@@ -7,8 +7,19 @@ from core import views
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", views.home, name="home"),
+    path("api/cars/", views.car_list_api, name="car_list_api"),
+    path("api/cars/search/", views.car_search_api, name="car_search_api"),
+    path(
+        "api/cars/<int:car_id>/similar/",
+        views.similar_cars_api,
+        name="similar_cars_api",
+    ),
+    path("api/recommendations/", views.recommendations_api, name="recommendations_api"),
+    path("api/cache/stats/", views.cache_stats_api, name="cache_stats_api"),
+    path("metrics/", views.metrics_view, name="metrics"),
     path("order/<int:car_id>/", views.create_order, name="create_order"),
     path("thanks/", views.thanks, name="thanks"),
+    path("search/", views.search_view, name="search"),
     path("users/", include("users.urls")),
     path("profile/", views.profile, name="profile"),
     path("favorite/add/<int:car_id>/", views.add_to_favorites, name="add_to_favorites"),
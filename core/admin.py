@@ -1,24 +1,144 @@
 # core/admin.py
+from django.conf import settings
 from django.contrib import admin
 from django.db import models
 from django.forms import Textarea
+from django.forms.models import BaseInlineFormSet
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
 from django.utils.html import format_html
-from django.urls import reverse
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.functional import cached_property
 from django.contrib import messages
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
-from .models import UserProfile, Car, ViewHistory, Favorite, Order, News, ChatMessage
+from .analytics import FUNNEL_FIELDS, dashboard_data
+from .forms import AnalyticsPeriodForm, InventoryUploadForm, OrderAdminForm
+from .fulltext import filter_matching
+from .images import variant_url
+from .inventory import (
+    CAR_EXPORT_FIELDS,
+    ORDER_EXPORT_FIELDS,
+    detect_format,
+    import_cars,
+    streaming_export,
+)
+from .models import (
+    UserProfile,
+    Car,
+    ViewHistory,
+    Favorite,
+    CarAlert,
+    Order,
+    OrderStatusChange,
+    News,
+    ChatMessage,
+    OutboundNotification,
+    DailyCarStats,
+)
+from .orders import transition_orders
+
+
+# ==============================
+# ПОИСК: полнотекстовый индекс вместо LIKE по всем search_fields
+# ==============================
+class FullTextSearchMixin:
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return super().get_search_results(request, queryset, search_term)
+        return filter_matching(queryset, search_term), False
+
+
+# ==============================
+# ВЫГРУЗКА: потоковый CSV/JSONL выбранных записей
+# ==============================
+class StreamingExportMixin:
+    export_fields = ()
+    export_filename = "export"
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        for fmt in ("csv", "jsonl"):
+            name = f"export_{fmt}"
+            actions[name] = (
+                lambda modeladmin, request, queryset, fmt=fmt: modeladmin.export(
+                    queryset, fmt
+                ),
+                name,
+                f"Выгрузить в {fmt.upper()}",
+            )
+        return actions
+
+    def export(self, queryset, fmt):
+        return streaming_export(queryset, self.export_fields, self.export_filename, fmt)
+
+
+# ==============================
+# INLINE: последние записи вместо всей истории + ссылка на полный список
+# ==============================
+class CappedInlineFormSet(BaseInlineFormSet):
+    limit = None
+
+    def get_queryset(self):
+        if not hasattr(self, "_queryset"):
+            queryset = super().get_queryset()[: self.limit]
+            # Родитель у всех строк один: подставляем его, а не читаем на строку
+            # (__str__ строки в табличном инлайне обращается к нему)
+            for obj in queryset:
+                self.fk.set_cached_value(obj, self.instance)
+            self._queryset = queryset
+        return self._queryset
+
+    @cached_property
+    def is_capped(self):
+        return self.instance.pk is not None and len(self.get_queryset()) >= self.limit
+
+    @cached_property
+    def total_count(self):
+        # COUNT нужен только когда показана полная порция
+        return self.queryset.count() if self.is_capped else len(self.get_queryset())
+
+    def changelist_url(self):
+        opts = self.model._meta
+        url = reverse(f"admin:{opts.app_label}_{opts.model_name}_changelist")
+        return f"{url}?{self.fk.name}__id__exact={self.instance.pk}"
+
+
+class CappedInlineMixin:
+    """Инлайн с последними ADMIN_INLINE_LIMIT записями, связи — одним JOIN.
+
+    Связанные объекты только для чтения: выпадающий список всех машин или
+    пользователей в каждой строке — самое дорогое на странице. Новые записи
+    добавляются в разделе модели.
+    """
+
+    template = "admin/edit_inline/capped_tabular.html"
+    formset = CappedInlineFormSet
+    list_select_related = ()
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(*self.list_select_related)
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.limit = settings.ADMIN_INLINE_LIMIT
+        return formset
+
+    def has_add_permission(self, request, obj=None):
+        return False
 
 
 # ==============================
 # INLINE: История просмотров (для UserAdmin)
 # ==============================
-class ViewHistoryInline(admin.TabularInline):
+class ViewHistoryInline(CappedInlineMixin, admin.TabularInline):
     model = ViewHistory
     fk_name = "user"
     extra = 0
-    readonly_fields = ("viewed_at",)
+    readonly_fields = ("car", "viewed_at")
     fields = ("car", "viewed_at")
+    list_select_related = ("car",)
     verbose_name = "Просмотр автомобиля"
     verbose_name_plural = "История просмотров"
 
@@ -26,12 +146,14 @@ class ViewHistoryInline(admin.TabularInline):
 # ==============================
 # INLINE: Избранные автомобили (для UserAdmin)
 # ==============================
-class FavoriteInline(admin.TabularInline):
+class FavoriteInline(CappedInlineMixin, admin.TabularInline):
     model = Favorite
     fk_name = "user"
     extra = 0
-    readonly_fields = ("added_at",)
+    readonly_fields = ("car", "added_at")
     fields = ("car", "added_at")
+    ordering = ("-added_at",)
+    list_select_related = ("car",)
     verbose_name = "Избранный автомобиль"
     verbose_name_plural = "Избранные автомобили"
 
@@ -39,12 +161,14 @@ class FavoriteInline(admin.TabularInline):
 # ==============================
 # INLINE: Заявки пользователя (для UserAdmin)
 # ==============================
-class OrderInline(admin.TabularInline):
+class OrderInline(CappedInlineMixin, admin.TabularInline):
     model = Order
     fk_name = "user"
     extra = 0
-    readonly_fields = ("created_at", "updated_at")
+    # Статус меняется в разделе заявок: там проверка переходов и история
+    readonly_fields = ("car", "status", "created_at", "updated_at")
     fields = ("car", "status", "created_at", "comment")
+    list_select_related = ("car",)
     verbose_name = "Заявка на автомобиль"
     verbose_name_plural = "Заявки пользователя"
 
@@ -52,12 +176,14 @@ class OrderInline(admin.TabularInline):
 # ==============================
 # INLINE: Сообщения чата (отправленные) (для UserAdmin)
 # ==============================
-class SentMessagesInline(admin.TabularInline):
+class SentMessagesInline(CappedInlineMixin, admin.TabularInline):
     model = ChatMessage
     fk_name = "user"
     extra = 0
     readonly_fields = ("created_at", "is_read", "admin")
     fields = ("message", "admin", "is_read", "created_at")
+    ordering = ("-created_at",)
+    list_select_related = ("admin",)
     verbose_name = "Отправленное сообщение"
     verbose_name_plural = "Отправленные сообщения"
 
@@ -84,6 +210,8 @@ class UserProfileAdmin(admin.ModelAdmin):
     list_filter = ("user__is_active", "user__is_staff")
     search_fields = ("user__username", "user__email", "phone", "telegram_chat_id")
     readonly_fields = ("avatar_preview",)
+    list_select_related = ("user",)
+    autocomplete_fields = ("user",)
     # Убрали inlines — они не работают здесь
     fieldsets = (
         ("Основная информация", {"fields": ("user", "phone", "telegram_chat_id")}),
@@ -94,7 +222,7 @@ class UserProfileAdmin(admin.ModelAdmin):
         if obj.avatar:
             return format_html(
                 '<img src="{}" style="width: 50px; height: 50px; border-radius: 50%;" />',
-                obj.avatar.url,
+                variant_url(obj.avatar, "xs"),
             )
         return "Нет аватара"
 
@@ -104,11 +232,12 @@ class UserProfileAdmin(admin.ModelAdmin):
 # ==============================
 # INLINE: Заявки на автомобиль (для CarAdmin)
 # ==============================
-class OrderCarInline(admin.TabularInline):
+class OrderCarInline(CappedInlineMixin, admin.TabularInline):
     model = Order
     extra = 0
-    readonly_fields = ("created_at", "updated_at", "user")
+    readonly_fields = ("created_at", "updated_at", "user", "status")
     fields = ("user", "status", "created_at", "comment")
+    list_select_related = ("user",)
     verbose_name = "Заявка на этот автомобиль"
     verbose_name_plural = "Заявки на этот автомобиль"
 
@@ -116,11 +245,12 @@ class OrderCarInline(admin.TabularInline):
 # ==============================
 # INLINE: Просмотры автомобиля (для CarAdmin)
 # ==============================
-class ViewHistoryCarInline(admin.TabularInline):
+class ViewHistoryCarInline(CappedInlineMixin, admin.TabularInline):
     model = ViewHistory
     extra = 0
     readonly_fields = ("viewed_at", "user")
     fields = ("user", "viewed_at")
+    list_select_related = ("user",)
     verbose_name = "Просмотр этого автомобиля"
     verbose_name_plural = "Просмотры этого автомобиля"
 
@@ -128,11 +258,13 @@ class ViewHistoryCarInline(admin.TabularInline):
 # ==============================
 # INLINE: Избранные автомобилем (для CarAdmin)
 # ==============================
-class FavoriteCarInline(admin.TabularInline):
+class FavoriteCarInline(CappedInlineMixin, admin.TabularInline):
     model = Favorite
     extra = 0
     readonly_fields = ("added_at", "user")
     fields = ("user", "added_at")
+    ordering = ("-added_at",)
+    list_select_related = ("user",)
     verbose_name = "Добавил в избранное"
     verbose_name_plural = "Добавили в избранное"
 
@@ -141,23 +273,36 @@ class FavoriteCarInline(admin.TabularInline):
 # АДМИНКА: Автомобиль
 # ==============================
 @admin.register(Car)
-class CarAdmin(admin.ModelAdmin):
+class CarAdmin(StreamingExportMixin, FullTextSearchMixin, admin.ModelAdmin):
+    export_fields = CAR_EXPORT_FIELDS
+    export_filename = "cars"
+    change_list_template = "admin/core/car/change_list.html"
     list_display = (
         "brand_model_year",
         "price",
         "status",
+        "views_count",
+        "favorites_count",
+        "orders_count",
         "created_at",
         "photo_preview",
     )
     list_filter = ("status", "brand", "year")
     search_fields = ("brand", "model", "description")
-    readonly_fields = ("created_at", "photo_preview")
+    readonly_fields = (
+        "created_at",
+        "photo_preview",
+        "views_count",
+        "favorites_count",
+        "orders_count",
+    )
     inlines = [OrderCarInline, ViewHistoryCarInline, FavoriteCarInline]
     fieldsets = (
         (
             "Основная информация",
             {
                 "fields": (
+                    "vin",
                     "brand",
                     "model",
                     "year",
@@ -169,10 +314,51 @@ class CarAdmin(admin.ModelAdmin):
             },
         ),
         ("Описание и медиа", {"fields": ("description", "photo", "photo_preview")}),
+        (
+            "Популярность",
+            {"fields": ("views_count", "favorites_count", "orders_count")},
+        ),
         ("Системные поля", {"fields": ("created_at",)}),
     )
     list_editable = ("status",)
 
+    def get_urls(self):
+        return [
+            path(
+                "import/",
+                self.admin_site.admin_view(self.import_view),
+                name="core_car_import",
+            ),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        # Загрузка остатков от поставщика: файл читается потоком, пачками
+        if not self.has_add_permission(request) or not self.has_change_permission(
+            request
+        ):
+            return redirect("admin:core_car_changelist")
+
+        form = InventoryUploadForm(request.POST or None, request.FILES or None)
+        if request.method == "POST" and form.is_valid():
+            upload = form.cleaned_data["file"]
+            result = import_cars(upload, detect_format(upload.name))
+            level = messages.WARNING if result.failed else messages.SUCCESS
+            self.message_user(request, f"Импорт завершён: {result}", level)
+            for line, errors in result.errors[:10]:
+                self.message_user(request, f"Строка {line}: {errors}", messages.ERROR)
+            return redirect("admin:core_car_changelist")
+
+        return TemplateResponse(
+            request,
+            "admin/core/car/import.html",
+            {
+                **self.admin_site.each_context(request),
+                "opts": self.model._meta,
+                "form": form,
+                "title": "Импорт автомобилей",
+            },
+        )
+
     def brand_model_year(self, obj):
         return f"{obj.brand} {obj.model} ({obj.year})"
 
@@ -182,7 +368,7 @@ class CarAdmin(admin.ModelAdmin):
         if obj.photo:
             return format_html(
                 '<img src="{}" style="width: 100px; height: auto; border: 1px solid #ccc;" />',
-                obj.photo.url,
+                variant_url(obj.photo, "xs"),
             )
         return "Нет фото"
 
@@ -198,6 +384,8 @@ class ViewHistoryAdmin(admin.ModelAdmin):
     list_filter = ("viewed_at", "user")
     search_fields = ("user__username", "car__brand", "car__model")
     readonly_fields = ("viewed_at",)
+    list_select_related = ("user", "car")
+    autocomplete_fields = ("user", "car")
 
 
 # ==============================
@@ -209,44 +397,123 @@ class FavoriteAdmin(admin.ModelAdmin):
     list_filter = ("added_at", "user")
     search_fields = ("user__username", "car__brand", "car__model")
     readonly_fields = ("added_at",)
+    list_select_related = ("user", "car")
+    autocomplete_fields = ("user", "car")
+
+
+# ==============================
+# АДМИНКА: Оповещения об избранном (удаление разрешает повтор)
+# ==============================
+@admin.register(CarAlert)
+class CarAlertAdmin(admin.ModelAdmin):
+    list_display = ("user", "car", "kind", "value", "created_at")
+    list_filter = ("kind", "created_at")
+    search_fields = ("user__username", "car__brand", "car__model")
+    list_select_related = ("user", "car")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+# ==============================
+# INLINE: История статусов (для OrderAdmin)
+# ==============================
+class OrderStatusChangeInline(CappedInlineMixin, admin.TabularInline):
+    model = OrderStatusChange
+    extra = 0
+    fields = ("from_status", "to_status", "changed_by", "changed_at")
+    readonly_fields = fields
+    list_select_related = ("changed_by",)
+    verbose_name = "Смена статуса"
+    verbose_name_plural = "История статусов"
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 
 # ==============================
 # АДМИНКА: Заявка
 # ==============================
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(StreamingExportMixin, admin.ModelAdmin):
+    export_fields = ORDER_EXPORT_FIELDS
+    export_filename = "orders"
     list_display = ("id", "user", "car", "status", "created_at", "updated_at")
     list_filter = ("status", "created_at", "updated_at")
     search_fields = ("user__username", "car__brand", "car__model", "comment")
     readonly_fields = ("created_at", "updated_at")
+    list_select_related = ("user", "car")
+    autocomplete_fields = ("user", "car")
     list_editable = ("status",)
     actions = ["mark_as_in_progress", "mark_as_completed", "mark_as_cancelled"]
 
+    form = OrderAdminForm
+    inlines = [OrderStatusChangeInline]
+
+    def get_changelist_form(self, request, **kwargs):
+        # Статус в списке проверяется так же, как в форме заявки
+        return super().get_changelist_form(request, form=OrderAdminForm, **kwargs)
+
+    def save_model(self, request, obj, form, change):
+        # Для истории статусов: кто изменил (см. signals.record_order_status_change)
+        obj._changed_by = request.user
+        super().save_model(request, obj, form, change)
+
+    def transition(self, request, queryset, status, level):
+        # Одним UPDATE, с историей и одной сводкой уведомлений на всё действие
+        result = transition_orders(queryset, status, user=request.user)
+        self.message_user(request, f"Обновлено {result.changed} заявок.", level)
+        if result.skipped:
+            self.message_user(
+                request,
+                f"Пропущено {result.skipped}: переход из текущего статуса запрещён.",
+                messages.WARNING,
+            )
+
     def mark_as_in_progress(self, request, queryset):
-        updated = queryset.update(status="in_progress")
-        self.message_user(request, f"Обновлено {updated} заявок.", messages.SUCCESS)
+        self.transition(request, queryset, "in_progress", messages.SUCCESS)
 
     mark_as_in_progress.short_description = "Перевести в статус 'В работе'"
 
     def mark_as_completed(self, request, queryset):
-        updated = queryset.update(status="completed")
-        self.message_user(request, f"Обновлено {updated} заявок.", messages.SUCCESS)
+        self.transition(request, queryset, "completed", messages.SUCCESS)
 
     mark_as_completed.short_description = "Перевести в статус 'Завершена'"
 
     def mark_as_cancelled(self, request, queryset):
-        updated = queryset.update(status="cancelled")
-        self.message_user(request, f"Обновлено {updated} заявок.", messages.WARNING)
+        self.transition(request, queryset, "cancelled", messages.WARNING)
 
     mark_as_cancelled.short_description = "Перевести в статус 'Отменена'"
 
 
+# ==============================
+# АДМИНКА: История статусов заявок (только чтение)
+# ==============================
+@admin.register(OrderStatusChange)
+class OrderStatusChangeAdmin(admin.ModelAdmin):
+    list_display = ("order", "from_status", "to_status", "changed_by", "changed_at")
+    list_filter = ("to_status", "changed_at")
+    search_fields = ("order__id", "changed_by__username")
+    list_select_related = ("order__user", "order__car", "changed_by")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 # ==============================
 # АДМИНКА: Новости (Акции)
 # ==============================
 @admin.register(News)
-class NewsAdmin(admin.ModelAdmin):
+class NewsAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ("title", "is_active", "created_at", "image_preview")
     list_filter = ("is_active", "created_at")
     search_fields = ("title", "content")
@@ -257,7 +524,7 @@ class NewsAdmin(admin.ModelAdmin):
         if obj.image:
             return format_html(
                 '<img src="{}" style="width: 100px; height: auto; border: 1px solid #ccc;" />',
-                obj.image.url,
+                variant_url(obj.image, "xs"),
             )
         return "Нет изображения"
 
@@ -273,6 +540,8 @@ class ChatMessageAdmin(admin.ModelAdmin):
     list_filter = ("is_read", "created_at", "admin")
     search_fields = ("user__username", "admin__username", "message")
     readonly_fields = ("created_at",)
+    list_select_related = ("user", "admin")
+    autocomplete_fields = ("user", "admin", "car")
     list_editable = ("is_read",)
 
     def message_preview(self, obj):
@@ -281,6 +550,76 @@ class ChatMessageAdmin(admin.ModelAdmin):
     message_preview.short_description = "Сообщение (предпросмотр)"
 
 
+# ==============================
+# АДМИНКА: Очередь Telegram-уведомлений
+# ==============================
+@admin.register(OutboundNotification)
+class OutboundNotificationAdmin(admin.ModelAdmin):
+    list_display = ("id", "chat_id", "status", "attempts", "created_at", "sent_at")
+    list_filter = ("status", "created_at")
+    search_fields = ("chat_id", "text")
+    readonly_fields = ("created_at", "sent_at", "last_error")
+    actions = ["retry_now"]
+
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status="sent").update(
+            status="pending", next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f"Повторно в очереди: {updated}.", messages.SUCCESS)
+
+    retry_now.short_description = "Отправить повторно"
+
+
+# ==============================
+# АДМИНКА: Аналитика воронки (только роллапы)
+# ==============================
+@admin.register(DailyCarStats)
+class DailyCarStatsAdmin(admin.ModelAdmin):
+    change_list_template = "admin/core/dailycarstats/change_list.html"
+    list_display = ("date", "brand", "car", *FUNNEL_FIELDS)
+    list_filter = ("date", "brand")
+    search_fields = ("brand",)
+    list_select_related = ("car",)
+    date_hierarchy = "date"
+    # Итоги пишет только update_rollups
+    readonly_fields = ("date", "brand", "car", *FUNNEL_FIELDS)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                "dashboard/",
+                self.admin_site.admin_view(self.dashboard_view),
+                name="core_dailycarstats_dashboard",
+            ),
+        ] + super().get_urls()
+
+    def dashboard_view(self, request):
+        if not self.has_view_permission(request):
+            return redirect("admin:index")
+
+        form = AnalyticsPeriodForm(request.GET or None)
+        start, end = form.period()
+        return TemplateResponse(
+            request,
+            "admin/core/dailycarstats/dashboard.html",
+            {
+                **self.admin_site.each_context(request),
+                "opts": self.model._meta,
+                "form": form,
+                "start": start,
+                "end": end,
+                "title": "Воронка продаж",
+                **dashboard_data(start, end),
+            },
+        )
+
+
 # ==============================
 # КАСТОМНАЯ АДМИНКА: User — С ИНЛАЙНАМИ
 # ==============================
@@ -295,6 +634,7 @@ class UserAdmin(BaseUserAdmin):
         "get_telegram_chat_id",
     )
     list_filter = ("is_staff", "is_superuser", "is_active", "groups")
+    list_select_related = ("profile",)
 
     def get_telegram_chat_id(self, obj):
         return obj.profile.telegram_chat_id if hasattr(obj, "profile") else "—"
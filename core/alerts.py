@@ -0,0 +1,273 @@
+# core/alerts.py
+"""Оповещения об избранном: снижение цены и возврат машины в наличие.
+
+Прежние цена и статус приходят из сигналов (post_save и cars_updated) и после
+коммита копятся ALERTS_WINDOW секунд. Разбор окна идёт в фоновом потоке и не
+зависит от числа пользователей: один запрос текущего состояния машин, один —
+Favorite по всем изменившимся машинам, один — уже отправленных оповещений
+и один INSERT новых с RETURNING; рассылка идёт только по строкам, которые
+вставил именно этот разбор. В Telegram уходит одно сообщение на пользователя через
+очередь уведомлений (лимиты соблюдает её воркер), в WebSocket — не больше
+ALERTS_MAX_PER_USER событий на пользователя за окно и только онлайн.
+"""
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, connections, router, transaction
+from django.utils import timezone
+
+from .models import BROADCAST_FIELDS, Car, CarAlert, Favorite
+from .notifications import enqueue_many
+from .presence import notify_users
+
+logger = logging.getLogger(__name__)
+
+# Сколько машин перечислять в одном сообщении Telegram
+SUMMARY_LIMIT = 20
+
+
+# ==============================
+# Поиск изменений
+# ==============================
+def _car_label(car):
+    return f"{car['brand']} {car['model']} ({car['year']})"
+
+
+def detect_changes(previous):
+    """Что изменилось с previous = {car_id: (цена, статус)}: список словарей.
+
+    Снижение цены считается только у машин в наличии.
+    """
+    today = timezone.localdate().isoformat()
+    changes = []
+    cars = Car.objects.filter(id__in=previous).values(
+        "id", "brand", "model", "year", "price", "status"
+    )
+    for car in cars:
+        if car["status"] != "available":
+            continue
+        old = dict(zip(BROADCAST_FIELDS, previous[car["id"]]))
+        change = {"car_id": car["id"], "car": _car_label(car), "price": car["price"]}
+        if old["price"] is not None and car["price"] < old["price"]:
+            changes.append(
+                {
+                    **change,
+                    "kind": "price_drop",
+                    "old_price": old["price"],
+                    "value": str(car["price"]),
+                }
+            )
+        if old["status"] != "available":
+            # Возврат в наличие оповещаем не чаще раза в день
+            changes.append({**change, "kind": "back_in_stock", "value": today})
+    return changes
+
+
+# ==============================
+# Рассылка
+# ==============================
+def _line(change):
+    if change["kind"] == "price_drop":
+        return (
+            f"{change['car']}: цена снижена "
+            f"{change['old_price']} → {change['price']} ₽"
+        )
+    return f"{change['car']}: снова в наличии, {change['price']} ₽"
+
+
+def _telegram_text(changes):
+    lines = [_line(change) for change in changes[:SUMMARY_LIMIT]]
+    if len(changes) > SUMMARY_LIMIT:
+        lines.append(f"… и ещё {len(changes) - SUMMARY_LIMIT}")
+    return "\n".join(["🔔 *Машины из избранного*", *lines])
+
+
+def _event(change):
+    event = {
+        "type": change["kind"],
+        "car_id": change["car_id"],
+        "car": change["car"],
+        "price": str(change["price"]),
+    }
+    if change["kind"] == "price_drop":
+        event["old_price"] = str(change["old_price"])
+    return event
+
+
+def _insert_new(alerts):
+    """Вставляет оповещения, пропуская уже записанные (car_alert_uniq).
+
+    Возвращает ключи (car_id, kind, value, user_id) строк, вставленных именно
+    этим вызовом: INSERT ... ON CONFLICT DO NOTHING RETURNING отдаёт только их.
+    """
+    connection = connections[router.db_for_write(CarAlert)]
+    fields = [
+        CarAlert._meta.get_field(name)
+        for name in ("car", "kind", "value", "user", "created_at")
+    ]
+    quote = connection.ops.quote_name
+    columns = ", ".join(quote(field.column) for field in fields)
+    key_columns = ", ".join(quote(field.column) for field in fields[:4])
+    row = "(%s)" % ", ".join(["%s"] * len(fields))
+    batch_size = min(connection.ops.bulk_batch_size(fields, alerts), 1000)
+
+    inserted = set()
+    with connection.cursor() as cursor:
+        for start in range(0, len(alerts), batch_size):
+            batch = alerts[start : start + batch_size]
+            cursor.execute(
+                f"INSERT INTO {quote(CarAlert._meta.db_table)} ({columns})"
+                f" VALUES {', '.join([row] * len(batch))}"
+                f" ON CONFLICT DO NOTHING RETURNING {key_columns}",
+                [
+                    field.get_db_prep_save(getattr(alert, field.attname), connection)
+                    for alert in batch
+                    for field in fields
+                ],
+            )
+            inserted.update(map(tuple, cursor.fetchall()))
+    return inserted
+
+
+def dispatch(changes, websocket=True):
+    """Оповещает подписчиков об изменениях, пропуская уже отправленное.
+
+    websocket=False — только записи об оповещениях и очередь Telegram.
+    Возвращает число новых оповещений.
+    """
+    if not changes:
+        return 0
+    by_car = defaultdict(list)
+    for change in changes:
+        by_car[change["car_id"]].append(change)
+
+    # Все подписчики всех машин — одним запросом вместе с Telegram-чатом
+    favorites = Favorite.objects.filter(car_id__in=by_car).values_list(
+        "user_id", "car_id", "user__profile__telegram_chat_id"
+    )
+    sent = set(
+        CarAlert.objects.filter(
+            car_id__in=by_car, value__in={change["value"] for change in changes}
+        ).values_list("car_id", "kind", "value", "user_id")
+    )
+
+    alerts = []
+    for user_id, car_id, _chat_id in favorites:
+        for change in by_car[car_id]:
+            if (car_id, change["kind"], change["value"], user_id) in sent:
+                continue
+            alerts.append(
+                CarAlert(
+                    user_id=user_id,
+                    car_id=car_id,
+                    kind=change["kind"],
+                    value=change["value"],
+                )
+            )
+    if not alerts:
+        return 0
+
+    with transaction.atomic():
+        # Параллельный разбор того же изменения в другом процессе упрётся в
+        # car_alert_uniq: его строки пропускаются и здесь не рассылаются
+        inserted = _insert_new(alerts)
+        by_user = defaultdict(list)
+        chats = {}
+        for user_id, car_id, chat_id in favorites:
+            for change in by_car[car_id]:
+                key = (car_id, change["kind"], change["value"], user_id)
+                if key not in inserted:
+                    continue
+                by_user[user_id].append(change)
+                if chat_id:
+                    chats[user_id] = chat_id
+        enqueue_many(
+            [
+                (chats[user_id], _telegram_text(items))
+                for user_id, items in by_user.items()
+                if user_id in chats
+            ]
+        )
+    if not websocket:
+        return len(inserted)
+    limit = settings.ALERTS_MAX_PER_USER
+    notify_users(
+        {
+            user_id: [_event(change) for change in items[:limit]]
+            for user_id, items in by_user.items()
+        }
+    )
+    return len(inserted)
+
+
+class AlertCollector:
+    """Копит прежние цену и статус машин и разбирает их пачкой раз в окно.
+
+    Несколько правок одной машины за окно сравниваются с состоянием до первой
+    из них: скидка, тут же отменённая, оповещения не даст.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def record(self, previous):
+        # Только после коммита: откаченная скидка никого не интересует
+        previous = dict(previous)
+        transaction.on_commit(lambda: self._add(previous))
+
+    def _add(self, previous):
+        with self._lock:
+            for car_id, state in previous.items():
+                self._pending.setdefault(car_id, state)
+            if self.window <= 0 or self._timer is not None:
+                timer = None
+            else:
+                timer = self._timer = threading.Timer(self.window, self._flush_in_thread)
+                timer.daemon = True
+        if timer is not None:
+            timer.start()
+        elif self.window <= 0:
+            self.flush()
+
+    def _flush_in_thread(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Не удалось разослать оповещения об избранном")
+        finally:
+            connection.close()
+
+    def _take(self):
+        with self._lock:
+            previous, self._pending = self._pending, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return previous
+
+    def flush(self, websocket=True):
+        previous = self._take()
+        if not previous:
+            return 0
+        return dispatch(detect_changes(previous), websocket=websocket)
+
+    def flush_at_exit(self):
+        # async_to_sync на выходе интерпретатора уже не работает, а клиенты
+        # WebSocket всё равно отключаются: сохраняем только записи об
+        # оповещениях и очередь Telegram
+        try:
+            self.flush(websocket=False)
+        except Exception:
+            logger.exception("Не удалось сохранить оповещения об избранном")
+
+
+car_alerts = AlertCollector(window=settings.ALERTS_WINDOW)
+
+# Не теряем окно ALERTS_WINDOW при остановке процесса
+atexit.register(car_alerts.flush_at_exit)
@@ -0,0 +1,252 @@
+# core/analytics.py
+"""Воронка «просмотр → избранное → заявка → завершена» по дням, машинам и маркам.
+
+Отчёты читают только DailyCarStats. Её дополняет команда update_rollups,
+которая берёт из исходных таблиц лишь новое с последней отметки:
+- просмотры и избранное только добавляются — считаем строки с id больше
+  отметки и прибавляем к итогам;
+- заявки меняют статус — по отметке updated_at находим дни создания
+  изменённых заявок и пересчитываем эти дни целиком (когорта по дню заявки).
+Удалённые строки отметку не двигают: они уйдут из итогов при пересчёте
+своего дня или при update_rollups --rebuild.
+
+Исключение — удалённые машины: их строки остаются с car=NULL, а исходные
+строки уходят каскадом. Такие строки — застывшая история продаж по маркам,
+ни пересчёт дня, ни --rebuild их не трогают.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyCarStats, Favorite, Order, RollupWatermark, ViewHistory
+
+FUNNEL_FIELDS = ("views", "favorites", "orders", "completed")
+
+# Источник -> (модель, поле времени, поле роллапа)
+EVENT_SOURCES = {
+    "views": (ViewHistory, "viewed_at", "views"),
+    "favorites": (Favorite, "added_at", "favorites"),
+}
+ORDERS_SOURCE = "orders"
+# Дней в одном запросе пересчёта заявок
+DAYS_PER_QUERY = 100
+
+
+# ==============================
+# Обновление роллапов
+# ==============================
+def _watermark(name):
+    watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(
+        name=name
+    )
+    return watermark
+
+
+def _load_rows(keys):
+    """Строки роллапов по ключам (дата, car_id): {ключ: DailyCarStats}."""
+    if not keys:
+        return {}
+    dates = {day for day, _ in keys}
+    car_ids = {car_id for _, car_id in keys}
+    return {
+        (row.date, row.car_id): row
+        for row in DailyCarStats.objects.filter(date__in=dates, car_id__in=car_ids)
+    }
+
+
+def _save_rows(rows, created, fields):
+    changed = [row for row in rows if row.pk is not None]
+    DailyCarStats.objects.bulk_create(created, batch_size=1000)
+    DailyCarStats.objects.bulk_update(changed, fields, batch_size=1000)
+
+
+def _roll_events(name, cutoff):
+    model, time_field, field = EVENT_SOURCES[name]
+    with transaction.atomic():
+        watermark = _watermark(name)
+        upper = model.objects.filter(
+            id__gt=watermark.last_id, **{f"{time_field}__lte": cutoff}
+        ).aggregate(upper=Max("id"))["upper"]
+        if upper is None:
+            return 0
+
+        counts = list(
+            model.objects.filter(id__gt=watermark.last_id, id__lte=upper)
+            .annotate(day=TruncDate(time_field))
+            .order_by()
+            .values_list("day", "car_id", "car__brand")
+            .annotate(count=Count("id"))
+        )
+        rows = _load_rows({(day, car_id) for day, car_id, _, _ in counts})
+        created = []
+        for day, car_id, brand, count in counts:
+            row = rows.get((day, car_id))
+            if row is None:
+                row = rows[day, car_id] = DailyCarStats(
+                    date=day, car_id=car_id, brand=brand
+                )
+                created.append(row)
+            setattr(row, field, getattr(row, field) + count)
+        _save_rows(rows.values(), created, [field])
+
+        watermark.last_id = upper
+        watermark.save()
+    return sum(count for *_, count in counts)
+
+
+def _day_bounds(day):
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    return start, start + datetime.timedelta(days=1)
+
+
+def _recount_orders(days):
+    # Заявки за дни целиком: диапазоны created_at идут по индексу
+    condition = Q()
+    for day in days:
+        start, end = _day_bounds(day)
+        condition |= Q(created_at__gte=start, created_at__lt=end)
+    counts = list(
+        Order.objects.filter(condition)
+        .annotate(day=TruncDate("created_at"))
+        .order_by()
+        .values_list("day", "car_id", "car__brand")
+        .annotate(
+            orders=Count("id"), completed=Count("id", filter=Q(status="completed"))
+        )
+    )
+
+    # Строки с заявками за эти дни и строки машин из пересчёта; у первых,
+    # которых нет в пересчёте (заявку удалили), счётчики обнулятся. Строки
+    # удалённых машин не трогаем: их заявок в исходной таблице уже нет
+    car_ids = {car_id for _, car_id, *_ in counts}
+    rows = {
+        (row.date, row.car_id): row
+        for row in DailyCarStats.objects.filter(
+            date__in=days, car__isnull=False
+        ).filter(Q(orders__gt=0) | Q(car_id__in=car_ids))
+    }
+    for row in rows.values():
+        row.orders = row.completed = 0
+    created = []
+    for day, car_id, brand, orders, completed in counts:
+        row = rows.get((day, car_id))
+        if row is None:
+            row = rows[day, car_id] = DailyCarStats(
+                date=day, car_id=car_id, brand=brand
+            )
+            created.append(row)
+        row.orders, row.completed = orders, completed
+    _save_rows(rows.values(), created, ["orders", "completed"])
+
+
+def _roll_orders(cutoff):
+    with transaction.atomic():
+        watermark = _watermark(ORDERS_SOURCE)
+        changed = Order.objects.filter(updated_at__lte=cutoff)
+        if watermark.last_time is not None:
+            changed = changed.filter(updated_at__gt=watermark.last_time)
+        days = sorted(
+            set(
+                changed.annotate(day=TruncDate("created_at"))
+                .order_by()
+                .values_list("day", flat=True)
+                .distinct()
+            )
+        )
+        for start in range(0, len(days), DAYS_PER_QUERY):
+            _recount_orders(days[start : start + DAYS_PER_QUERY])
+
+        watermark.last_time = cutoff
+        watermark.save()
+    return len(days)
+
+
+def update_rollups(now=None):
+    """Дополняет роллапы новыми данными. Возвращает {источник: обработано}."""
+    now = now or timezone.now()
+    # Свежие строки могут принадлежать незакоммиченным транзакциям
+    cutoff = now - datetime.timedelta(seconds=settings.ANALYTICS_LAG_SECONDS)
+    processed = {name: _roll_events(name, cutoff) for name in EVENT_SOURCES}
+    processed[ORDERS_SOURCE] = _roll_orders(cutoff)
+    return processed
+
+
+def rebuild_rollups(now=None):
+    """Строит роллапы заново по всей истории.
+
+    Строки удалённых машин (car=NULL) остаются: пересчитать их не из чего.
+    """
+    with transaction.atomic():
+        DailyCarStats.objects.filter(car__isnull=False).delete()
+        RollupWatermark.objects.all().delete()
+        return update_rollups(now)
+
+
+# ==============================
+# Отчёты
+# ==============================
+def _sums():
+    # Имена агрегатов не должны совпадать с полями модели
+    return {f"total_{field}": Sum(field) for field in FUNNEL_FIELDS}
+
+
+def _rate(part, whole):
+    return round(100 * part / whole, 1) if whole else None
+
+
+def with_conversion(row):
+    """Добавляет к строке отчёта конверсии шагов воронки в процентах."""
+    row = dict(row)
+    for field in FUNNEL_FIELDS:
+        row[field] = row.pop(f"total_{field}", None) or 0
+    row["view_to_favorite"] = _rate(row["favorites"], row["views"])
+    row["view_to_order"] = _rate(row["orders"], row["views"])
+    row["order_to_completed"] = _rate(row["completed"], row["orders"])
+    return row
+
+
+def _period(start, end):
+    return DailyCarStats.objects.filter(date__gte=start, date__lte=end)
+
+
+def funnel_totals(start, end):
+    return with_conversion(_period(start, end).aggregate(**_sums()))
+
+
+def daily_report(start, end):
+    rows = _period(start, end).values("date").annotate(**_sums()).order_by("date")
+    return [with_conversion(row) for row in rows]
+
+
+def brand_report(start, end):
+    rows = (
+        _period(start, end)
+        .values("brand")
+        .annotate(**_sums())
+        .order_by("-total_orders", "-total_views", "brand")
+    )
+    return [with_conversion(row) for row in rows]
+
+
+def car_report(start, end, limit=20):
+    rows = (
+        _period(start, end)
+        .filter(car__isnull=False)
+        .values("car_id", "car__brand", "car__model", "car__year")
+        .annotate(**_sums())
+        .order_by("-total_orders", "-total_views", "car_id")[:limit]
+    )
+    return [with_conversion(row) for row in rows]
+
+
+def dashboard_data(start, end):
+    return {
+        "totals": funnel_totals(start, end),
+        "days": daily_report(start, end),
+        "brands": brand_report(start, end),
+        "cars": car_report(start, end),
+    }
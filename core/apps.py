@@ -7,4 +7,5 @@ class CoreConfig(AppConfig):
     verbose_name = "Автосалон"
 
     def ready(self):
+        import core.checks
         import core.signals
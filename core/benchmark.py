@@ -0,0 +1,327 @@
+# core/benchmark.py
+"""Нагрузочные замеры ASGI-приложения и WebSocket-консьюмеров в одном процессе.
+
+Запуск: python manage.py benchmark --help. Работает на отдельной тестовой БД
+с сгенерированными данными и in-memory слоем каналов, результаты — в JSON.
+"""
+import asyncio
+import platform
+import random
+import statistics
+import subprocess
+import time
+from decimal import Decimal
+
+import django
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from channels.testing import HttpCommunicator, WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.utils.crypto import get_random_string
+
+from .broadcast import shard_group
+from .counters import reconcile as reconcile_counters
+from .models import Car, Favorite, Order, ViewHistory
+
+BRANDS = ["Toyota", "BMW", "Kia", "Hyundai", "Lada", "Audi", "Skoda", "Mazda"]
+COLORS = ["Белый", "Чёрный", "Серый", "Синий", "Красный"]
+
+HTTP_SCENARIOS = ("home", "profile", "create_order")
+WS_SCENARIOS = ("chat_fanout", "notification_fanout", "car_fanout")
+SCENARIOS = HTTP_SCENARIOS + WS_SCENARIOS
+
+
+# ==============================
+# Данные
+# ==============================
+def seed(cars, users, seed_value=42):
+    """Заполняет БД: cars машин, users покупателей, менеджер и история."""
+    rng = random.Random(seed_value)
+    Car.objects.bulk_create(
+        [
+            Car(
+                brand=rng.choice(BRANDS),
+                model=f"Model {rng.randint(1, 30)}",
+                year=rng.randint(2005, 2025),
+                mileage=rng.randint(0, 300_000),
+                color=rng.choice(COLORS),
+                price=Decimal(rng.randint(300, 9000) * 1000),
+                description="Автомобиль в хорошем состоянии, обслуживался у дилера.",
+            )
+            for _ in range(cars)
+        ],
+        batch_size=1000,
+    )
+    password = make_password(None)
+    User.objects.bulk_create(
+        [User(username=f"bench_user_{i}", password=password) for i in range(users)],
+        batch_size=1000,
+    )
+    manager = User.objects.create_superuser("bench_manager", "manager@example.com", None)
+
+    car_ids = list(Car.objects.values_list("id", flat=True))
+    customers = list(User.objects.filter(username__startswith="bench_user_"))
+    for user in customers:
+        sample = rng.sample(car_ids, min(len(car_ids), 20))
+        ViewHistory.objects.bulk_create(
+            [ViewHistory(user=user, car_id=car_id) for car_id in sample],
+            ignore_conflicts=True,
+        )
+        Favorite.objects.bulk_create(
+            [Favorite(user=user, car_id=car_id) for car_id in sample[:5]],
+            ignore_conflicts=True,
+        )
+        Order.objects.bulk_create(
+            [Order(user=user, car_id=car_id) for car_id in sample[:3]]
+        )
+    # bulk_create не трогает счётчики популярности — пересчитываем разом
+    reconcile_counters()
+    return {"cars": car_ids, "customers": customers, "manager": manager}
+
+
+def session_cookie(user):
+    """Cookie авторизованной сессии — как после обычного входа на сайт."""
+    session = SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = "django.contrib.auth.backends.ModelBackend"
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.create()
+    return f"{settings.SESSION_COOKIE_NAME}={session.session_key}"
+
+
+# ==============================
+# Статистика
+# ==============================
+def summarize(latencies, elapsed, errors=0):
+    if not latencies:
+        return {"count": 0, "errors": errors}
+    ordered = sorted(latencies)
+    cuts = statistics.quantiles(ordered, n=100) if len(ordered) > 1 else ordered * 99
+    return {
+        "count": len(ordered),
+        "errors": errors,
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p90_ms": round(cuts[89] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "throughput_per_s": round(len(ordered) / elapsed, 2) if elapsed else None,
+    }
+
+
+class Benchmark:
+    def __init__(
+        self,
+        application,
+        dataset,
+        requests=200,
+        concurrency=10,
+        connections=1000,
+        rounds=20,
+    ):
+        self.application = application
+        self.dataset = dataset
+        self.requests = requests
+        self.concurrency = concurrency
+        self.connections = connections
+        self.rounds = rounds
+        self.cookies = {}
+
+    async def cookie_for(self, user):
+        if user.pk not in self.cookies:
+            self.cookies[user.pk] = await sync_to_async(session_cookie)(user)
+        return self.cookies[user.pk]
+
+    # ------------------------------
+    # HTTP
+    # ------------------------------
+    async def _http(self, method, path, user=None, body=b""):
+        headers = [(b"host", b"testserver")]
+        cookies = []
+        if user is not None:
+            cookies.append(await self.cookie_for(user))
+        if method == "POST":
+            token = get_random_string(32)
+            cookies.append(f"{settings.CSRF_COOKIE_NAME}={token}")
+            headers += [
+                (b"x-csrftoken", token.encode()),
+                (b"content-type", b"application/x-www-form-urlencoded"),
+            ]
+        if cookies:
+            headers.append((b"cookie", "; ".join(cookies).encode()))
+        communicator = HttpCommunicator(self.application, method, path, body, headers)
+        response = await communicator.get_response(timeout=30)
+        # Закрываем соединение, чтобы обработчик запроса завершился
+        await communicator.send_input({"type": "http.disconnect"})
+        await communicator.wait(timeout=30)
+        return response["status"]
+
+    async def run_http(self, scenario):
+        rng = random.Random(scenario)
+        customers = self.dataset["customers"]
+        car_ids = self.dataset["cars"]
+
+        def make_request():
+            user = rng.choice(customers)
+            if scenario == "home":
+                return "GET", "/", user, b"", (200,)
+            if scenario == "profile":
+                return "GET", "/profile/", user, b"", (200,)
+            return (
+                "POST",
+                f"/order/{rng.choice(car_ids)}/",
+                user,
+                b"comment=benchmark",
+                (302,),
+            )
+
+        requests = [make_request() for _ in range(self.requests)]
+        # Прогрев: сессии и ленивые импорты не должны попадать в замер
+        for user in {request[2] for request in requests}:
+            await self.cookie_for(user)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        latencies = []
+        errors = 0
+
+        async def one(method, path, user, body, expected):
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                status = await self._http(method, path, user, body)
+                latencies.append(time.perf_counter() - started)
+                if status not in expected:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(*request) for request in requests))
+        return summarize(latencies, time.perf_counter() - started, errors)
+
+    # ------------------------------
+    # WebSocket
+    # ------------------------------
+    async def _connect_many(self, path, user, drain_first=False):
+        cookie = await self.cookie_for(user)
+        headers = [(b"host", b"testserver"), (b"cookie", cookie.encode())]
+        communicators = []
+        connect_latencies = []
+        for _ in range(self.connections):
+            communicator = WebsocketCommunicator(self.application, path, headers)
+            started = time.perf_counter()
+            connected, _ = await communicator.connect(timeout=30)
+            if not connected:
+                raise RuntimeError(f"Не удалось подключиться к {path}")
+            if drain_first:
+                # История чата, которую консьюмер шлёт сразу после подключения
+                await communicator.receive_from(timeout=30)
+            connect_latencies.append(time.perf_counter() - started)
+            communicators.append(communicator)
+        return communicators, connect_latencies
+
+    async def _fanout(self, communicators, publish):
+        """Задержка доставки: от публикации до получения каждым клиентом."""
+        latencies = []
+        started_all = time.perf_counter()
+        for round_number in range(self.rounds):
+            started = time.perf_counter()
+            await publish(round_number)
+
+            async def receive(communicator):
+                await communicator.receive_from(timeout=30)
+                latencies.append(time.perf_counter() - started)
+
+            await asyncio.gather(*(receive(c) for c in communicators))
+        return summarize(latencies, time.perf_counter() - started_all)
+
+    async def run_ws(self, scenario):
+        manager = self.dataset["manager"]
+        layer = get_channel_layer()
+        car_id = self.dataset["cars"][0]
+
+        if scenario == "chat_fanout":
+            path = f"/ws/chat/{car_id}/"
+            communicators, connect = await self._connect_many(path, manager, True)
+            sender = communicators[0]
+
+            async def publish(round_number):
+                await sender.send_json_to({"message": f"benchmark {round_number}"})
+
+        elif scenario == "notification_fanout":
+            communicators, connect = await self._connect_many("/ws/notifications/", manager)
+
+            async def publish(round_number):
+                await layer.group_send(
+                    "admin_notifications",
+                    {
+                        "type": "new_order",
+                        "order_id": round_number,
+                        "car": "Benchmark",
+                        "user": manager.username,
+                        "created_at": "",
+                    },
+                )
+
+        else:
+            communicators, connect = await self._connect_many("/ws/cars/", manager)
+            for communicator in communicators:
+                await communicator.send_json_to(
+                    {"action": "subscribe", "car_ids": [car_id]}
+                )
+                await communicator.receive_from(timeout=30)
+
+            async def publish(round_number):
+                await layer.group_send(
+                    shard_group(car_id),
+                    {
+                        "type": "cars_updated",
+                        "cars": [
+                            {
+                                "car_id": car_id,
+                                "status": "available",
+                                "price": str(round_number),
+                            }
+                        ],
+                    },
+                )
+
+        try:
+            result = await self._fanout(communicators, publish)
+        finally:
+            for communicator in communicators:
+                await communicator.disconnect()
+        result["connections"] = len(communicators)
+        result["connect"] = summarize(connect, sum(connect))
+        return result
+
+    async def run(self, scenarios):
+        results = {}
+        for scenario in scenarios:
+            if scenario in HTTP_SCENARIOS:
+                results[scenario] = await self.run_http(scenario)
+            else:
+                results[scenario] = await self.run_ws(scenario)
+        return results
+
+
+def environment_info():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": settings.DATABASES["default"]["ENGINE"],
+        "platform": platform.platform(),
+    }
@@ -0,0 +1,112 @@
+# core/broadcast.py
+import asyncio
+import logging
+import threading
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import Car
+
+logger = logging.getLogger(__name__)
+
+CAR_UPDATES_GROUP = "car_updates"
+
+
+def shard_group(car_id):
+    """Группа шарда машины: клиент подписывается только на шарды своих машин."""
+    return f"{CAR_UPDATES_GROUP}.shard_{int(car_id) % settings.CAR_UPDATES_SHARDS}"
+
+
+def serialize_update(car):
+    return {"car_id": car["id"], "status": car["status"], "price": str(car["price"])}
+
+
+class CarUpdatePublisher:
+    """Рассылка изменений цены и статуса машин по шардам car_updates.
+
+    Изменения копятся window секунд: несколько правок одной машины дают одно
+    событие с последними значениями, а машины одного шарда уходят одним
+    кадром cars_updated — group_send на шард за окно, а не на каждую машину.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def schedule(self, car_ids):
+        # Публикуем только после коммита: откаченные изменения клиентам не нужны
+        car_ids = set(car_ids)
+        transaction.on_commit(lambda: self._add(car_ids))
+
+    def _add(self, car_ids):
+        with self._lock:
+            self._pending.update(car_ids)
+            if self.window <= 0 or self._timer is not None:
+                timer = None
+            else:
+                timer = self._timer = threading.Timer(self.window, self._flush_in_thread)
+                timer.daemon = True
+        if timer is not None:
+            timer.start()
+        elif self.window <= 0:
+            # Окно 0 — без склейки, сразу после коммита
+            self.flush()
+
+    def _flush_in_thread(self):
+        try:
+            self.flush()
+        finally:
+            # Соединение с БД в потоке таймера — своё, закрываем его сами
+            connection.close()
+
+    def _take(self):
+        with self._lock:
+            car_ids, self._pending = self._pending, set()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return car_ids
+
+    def flush(self):
+        car_ids = self._take()
+        if not car_ids:
+            return 0
+        # Актуальное состояние читаем в момент отправки — это и есть склейка
+        shards = {}
+        for car in (
+            Car.objects.filter(id__in=car_ids)
+            .order_by("id")
+            .values("id", "status", "price")
+        ):
+            shards.setdefault(shard_group(car["id"]), []).append(serialize_update(car))
+        if shards:
+            async_to_sync(self._send)(shards)
+        return sum(len(cars) for cars in shards.values())
+
+    async def _send(self, shards):
+        layer = get_channel_layer()
+        # Все шарды разом: BatchingChannelLayer отправит их одной пачкой
+        results = await asyncio.gather(
+            *(
+                layer.group_send(group, {"type": "cars_updated", "cars": cars})
+                for group, cars in shards.items()
+            ),
+            return_exceptions=True,
+        )
+        for cars, result in zip(shards.values(), results):
+            if isinstance(result, Exception):
+                logger.error(
+                    "Не удалось разослать изменения %s машин",
+                    len(cars),
+                    exc_info=result,
+                )
+
+
+# Без atexit: при остановке процесса клиенты всё равно отключаются,
+# а async_to_sync на выходе интерпретатора уже не может запустить отправку
+car_updates = CarUpdatePublisher(window=settings.CAR_UPDATES_COALESCE_WINDOW)
@@ -0,0 +1,165 @@
+# core/cache.py
+import hashlib
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+
+# Версии: смена версии делает недоступными все ключи, собранные со старой.
+# Каталог целиком (страницы) и каждая машина (фрагменты карточек) — отдельно.
+CATALOG_VERSION_KEY = "version:catalog"
+CAR_VERSION_KEY = "version:car:{}"
+
+CARD_KEY = "card:{}:{}:{}"
+PAGE_KEY = "page:{}:{}"
+
+
+class CacheStats:
+    """Счётчики попаданий и промахов по видам кэша (в памяти процесса)."""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, kind, hits=0, misses=0):
+        with self._lock:
+            self._counts[f"{kind}_hits"] += hits
+            self._counts[f"{kind}_misses"] += misses
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self._counts)
+        for kind in ("card", "page"):
+            hits = counts.setdefault(f"{kind}_hits", 0)
+            misses = counts.setdefault(f"{kind}_misses", 0)
+            total = hits + misses
+            counts[f"{kind}_hit_ratio"] = round(hits / total, 4) if total else None
+        return counts
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+stats = CacheStats()
+
+
+# ==============================
+# Версии
+# ==============================
+def _new_version():
+    # Версия от времени, а не с 1: если ключ версии вытеснили из кэша,
+    # старые фрагменты с прежней версией не оживут
+    return int(time.time() * 1000)
+
+
+def get_versions(keys):
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return versions
+
+
+def bump(*keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), None)
+
+
+def bump_catalog():
+    bump(CATALOG_VERSION_KEY)
+
+
+def bump_cars(car_ids):
+    bump(*(CAR_VERSION_KEY.format(car_id) for car_id in car_ids), CATALOG_VERSION_KEY)
+
+
+# ==============================
+# Фрагменты: карточки машин
+# ==============================
+def render_car_cards(cars, user):
+    """HTML карточек: готовые берутся из кэша, остальные рендерятся и кладутся.
+
+    На всю страницу — два get_many и один set_many, а не запросы на каждую карточку.
+    """
+    cars = list(cars)
+    if not cars:
+        return ""
+    variant = "auth" if user.is_authenticated else "anon"
+    versions = get_versions([CAR_VERSION_KEY.format(car.id) for car in cars])
+    keys = {
+        car.id: CARD_KEY.format(
+            car.id, versions[CAR_VERSION_KEY.format(car.id)], variant
+        )
+        for car in cars
+    }
+    cached = cache.get_many(keys.values())
+
+    fragments = []
+    rendered = {}
+    for car in cars:
+        html = cached.get(keys[car.id])
+        if html is None:
+            html = render_to_string("includes/car_card.html", {"car": car, "user": user})
+            rendered[keys[car.id]] = html
+        fragments.append(html)
+
+    if rendered:
+        cache.set_many(rendered, settings.CACHE_FRAGMENT_TTL)
+    stats.record("card", hits=len(cars) - len(rendered), misses=len(rendered))
+    return "".join(fragments)
+
+
+# ==============================
+# Страницы целиком для анонимных посетителей
+# ==============================
+def _page_cacheable(request):
+    return (
+        request.method in ("GET", "HEAD")
+        and not request.user.is_authenticated
+        and not len(get_messages(request))
+    )
+
+
+def cache_anonymous_page(view):
+    """Кэширует ответ вьюхи для анонимов до смены версии каталога или CACHE_PAGE_TTL."""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if settings.CACHE_PAGE_TTL <= 0 or not _page_cacheable(request):
+            return view(request, *args, **kwargs)
+
+        version = get_versions([CATALOG_VERSION_KEY])[CATALOG_VERSION_KEY]
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        key = PAGE_KEY.format(version, path)
+
+        cached = cache.get(key)
+        if cached is not None:
+            stats.record("page", hits=1)
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response["X-Cache"] = "HIT"
+            return response
+
+        stats.record("page", misses=1)
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            cache.set(
+                key,
+                (response.content, response["Content-Type"]),
+                settings.CACHE_PAGE_TTL,
+            )
+        response["X-Cache"] = "MISS"
+        return response
+
+    return wrapper
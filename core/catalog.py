@@ -0,0 +1,122 @@
+# core/catalog.py
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from .images import variant_url
+from .models import Car
+
+# Порядок выдачи каталога. Последнее поле обязано быть уникальным (id),
+# иначе курсор не сможет однозначно продолжить выдачу.
+ORDERINGS = {
+    "new": ("-created_at", "-id"),
+    # Счётчики меняются между страницами — машина может сдвинуться
+    # на соседнюю страницу, но курсор от этого не ломается
+    "popular": ("-views_count", "-id"),
+}
+DEFAULT_ORDERING = "new"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class CatalogPage:
+    def __init__(self, cars, next_cursor, ordering):
+        self.cars = cars
+        self.next_cursor = next_cursor
+        self.ordering = ordering
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def _field_names(ordering):
+    return [name.lstrip("-") for name in ORDERINGS[ordering]]
+
+
+def encode_cursor(car, ordering=DEFAULT_ORDERING):
+    values = []
+    for name in _field_names(ordering):
+        value = getattr(car, name)
+        values.append(value.isoformat() if hasattr(value, "isoformat") else value)
+    payload = json.dumps([ordering, values], separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        ordering, raw_values = json.loads(base64.urlsafe_b64decode(padded))
+        names = _field_names(ordering)
+        if len(raw_values) != len(names):
+            raise ValueError
+        values = [
+            Car._meta.get_field(name).to_python(value)
+            for name, value in zip(names, raw_values)
+        ]
+    except (ValueError, TypeError, KeyError, ValidationError) as exc:
+        raise InvalidCursor("Некорректный курсор") from exc
+    return ordering, values
+
+
+def _after(ordering, values):
+    """Условие «строго после курсора» для составного ключа сортировки.
+
+    Для (-created_at, -id) это:
+    created_at < c OR (created_at = c AND id < i)
+    """
+    condition = Q()
+    equal = {}
+    for field, value in zip(ORDERINGS[ordering], values):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        condition |= Q(**equal, **{f"{name}__{lookup}": value})
+        equal[name] = value
+    return condition
+
+
+def get_catalog_page(queryset=None, cursor=None, limit=None, ordering=None):
+    """Страница каталога по курсору: стоимость не зависит от номера страницы."""
+    if queryset is None:
+        queryset = Car.objects.filter(status="available")
+    limit = limit or settings.CATALOG_PAGE_SIZE
+
+    if cursor:
+        cursor_ordering, values = decode_cursor(cursor)
+        ordering = ordering or cursor_ordering
+        if cursor_ordering != ordering:
+            raise InvalidCursor("Курсор относится к другой сортировке")
+        queryset = queryset.filter(_after(ordering, values))
+    ordering = ordering or DEFAULT_ORDERING
+    if ordering not in ORDERINGS:
+        raise InvalidCursor("Неизвестная сортировка")
+
+    # Берём на одну запись больше, чтобы узнать, есть ли следующая страница
+    cars = list(queryset.order_by(*ORDERINGS[ordering])[: limit + 1])
+    next_cursor = None
+    if len(cars) > limit:
+        cars = cars[:limit]
+        next_cursor = encode_cursor(cars[-1], ordering)
+    return CatalogPage(cars, next_cursor, ordering)
+
+
+def serialize_car(car):
+    return {
+        "id": car.id,
+        "brand": car.brand,
+        "model": car.model,
+        "year": car.year,
+        "mileage": car.mileage,
+        "color": car.color,
+        "price": str(car.price),
+        "status": car.status,
+        "photo": car.photo.url if car.photo else None,
+        "thumbnail": variant_url(car.photo, "sm"),
+        "description": car.description,
+        "created_at": car.created_at.isoformat(),
+    }
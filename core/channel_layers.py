@@ -0,0 +1,250 @@
+# core/channel_layers.py
+"""Слой каналов со склейкой group_send.
+
+BatchingChannelLayer оборачивает любой слой из настроек: group_send, вызванные
+за один проход цикла событий (например, через asyncio.gather), уходят одной
+пачкой. У RedisBatchChannelLayer пачка стоит два конвейера на хост Redis —
+состав всех групп и доставка всех сообщений, — вместо четырёх запросов на
+каждую группу в RedisChannelLayer. Прочие слои (InMemoryChannelLayer)
+получают пачку параллельными group_send. Размер пачек, групп и время
+отправки — в core/metrics.
+
+ThreadSafeInMemoryChannelLayer — слой в памяти процесса для CHANNEL_LAYER=memory:
+отправки из потоков таймеров и прочих async_to_sync передаёт циклу сервера.
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict
+
+from channels.layers import InMemoryChannelLayer
+from channels_redis.core import RedisChannelLayer
+from django.utils.module_loading import import_string
+
+from .metrics import channel_batch_size, channel_group_size, channel_send_duration
+
+logger = logging.getLogger(__name__)
+
+# Шаг оценки между сообщениями одному каналу в пачке, секунды: больше
+# точности float у time.time(), но меньше промежутка до следующей отправки
+SCORE_STEP = 1e-6
+
+# Скрипт RedisChannelLayer.group_send, но со своей оценкой ZADD у каждого
+# сообщения: ключи каналов здесь повторяются (сообщения разных групп одному
+# каналу), а при равных оценках receive (BZPOPMIN) берёт их в порядке байтов,
+# а не отправки
+GROUP_SEND_LUA = """
+    local over_capacity = 0
+    local expiry = ARGV[#ARGV]
+    for i=1,#KEYS do
+        if redis.call('ZCOUNT', KEYS[i], '-inf', '+inf') < tonumber(ARGV[i + #KEYS]) then
+            redis.call('ZADD', KEYS[i], ARGV[i + 2 * #KEYS], ARGV[i])
+            redis.call('EXPIRE', KEYS[i], expiry)
+        else
+            over_capacity = over_capacity + 1
+        end
+    end
+    return over_capacity
+"""
+
+
+class RedisBatchChannelLayer(RedisChannelLayer):
+    """RedisChannelLayer с group_send_many — отправкой в много групп сразу."""
+
+    async def group_send_many(self, items):
+        """items — пары (группа, сообщение). Возвращает число каналов групп."""
+        members = await self._group_members([group for group, _ in items])
+
+        # Сообщения всех групп раскладываем по хостам каналов
+        keys = defaultdict(list)
+        messages = defaultdict(list)
+        capacities = defaultdict(list)
+        for (group, message), channel_names in zip(items, members):
+            by_host, key_messages, key_capacities = (
+                self._map_channel_keys_to_connection(channel_names, message)
+            )
+            for host, channel_keys in by_host.items():
+                keys[host] += channel_keys
+                messages[host] += [key_messages[key] for key in channel_keys]
+                capacities[host] += [key_capacities[key] for key in channel_keys]
+
+        await asyncio.gather(
+            *(
+                self._deliver(host, keys[host], messages[host], capacities[host])
+                for host in keys
+            )
+        )
+        return [len(channel_names) for channel_names in members]
+
+    async def _group_members(self, groups):
+        # Чистка просроченных и состав групп — один конвейер на хост
+        by_host = defaultdict(list)
+        for position, group in enumerate(groups):
+            assert self.require_valid_group_name(group), "Group name not valid"
+            by_host[self.consistent_hash(group)].append(position)
+
+        members = [None] * len(groups)
+        expired = int(time.time()) - self.group_expiry
+
+        async def load(host, positions):
+            pipe = self.connection(host).pipeline()
+            for position in positions:
+                key = self._group_key(groups[position])
+                pipe.zremrangebyscore(key, min=0, max=expired)
+                pipe.zrange(key, 0, -1)
+            results = await pipe.execute()
+            for position, names in zip(positions, results[1::2]):
+                members[position] = [name.decode("utf8") for name in names]
+
+        await asyncio.gather(
+            *(load(host, positions) for host, positions in by_host.items())
+        )
+        return members
+
+    async def _deliver(self, host, keys, messages, capacities):
+        pipe = self.connection(host).pipeline()
+        now = time.time()
+        expired = int(now) - int(self.expiry)
+        for key in set(keys):
+            pipe.zremrangebyscore(key, min=0, max=expired)
+        # Повтор канала в пачке — оценка на шаг больше предыдущей: сообщения
+        # одному каналу вычитываются в порядке отправки
+        sent = defaultdict(int)
+        scores = []
+        for key in keys:
+            scores.append(now + sent[key] * SCORE_STEP)
+            sent[key] += 1
+        pipe.eval(
+            GROUP_SEND_LUA,
+            len(keys),
+            *keys,
+            *messages,
+            *capacities,
+            *scores,
+            self.expiry,
+        )
+        over_capacity = (await pipe.execute())[-1]
+        if over_capacity:
+            logger.info("%s из %s каналов переполнены", over_capacity, len(keys))
+
+
+class ThreadSafeInMemoryChannelLayer(InMemoryChannelLayer):
+    """InMemoryChannelLayer, которому можно слать из других потоков.
+
+    Очереди каналов — asyncio.Queue цикла сервера: put из чужого цикла
+    (async_to_sync в потоке таймера core/broadcast.py или core/alerts.py)
+    не будит ждущий receive, и сообщение доходит лишь с его следующим
+    пробуждением. Поэтому слой запоминает цикл, в котором ждут receive, и
+    send/group_send/group_add/group_discard из других циклов выполняет в нём
+    через run_coroutine_threadsafe.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._loop = None
+
+    async def receive(self, channel):
+        self._loop = asyncio.get_running_loop()
+        return await super().receive(channel)
+
+    async def _on_server_loop(self, method, *args):
+        loop = self._loop
+        if (
+            loop is None
+            or loop is asyncio.get_running_loop()
+            or not loop.is_running()
+        ):
+            # Сервер ещё не слушает или уже остановлен — отправляем на месте
+            return await method(*args)
+        return await asyncio.wrap_future(
+            asyncio.run_coroutine_threadsafe(method(*args), loop)
+        )
+
+    async def send(self, channel, message):
+        await self._on_server_loop(super().send, channel, message)
+
+    async def group_send(self, group, message):
+        await self._on_server_loop(super().group_send, group, message)
+
+    async def group_add(self, group, channel):
+        await self._on_server_loop(super().group_add, group, channel)
+
+    async def group_discard(self, group, channel):
+        await self._on_server_loop(super().group_discard, group, channel)
+
+
+class BatchingChannelLayer:
+    """Обёртка слоя каналов: склеивает group_send одного прохода цикла событий.
+
+    В CHANNEL_LAYERS: {"BACKEND": "core.channel_layers.BatchingChannelLayer",
+    "CONFIG": {"backend": "<путь к слою>", "config": {...}}}. Остальные методы
+    (send, receive, group_add ...) уходят во вложенный слой как есть.
+    """
+
+    def __init__(self, backend, config=None):
+        self.inner = import_string(backend)(**(config or {}))
+        self.layer_name = type(self.inner).__name__
+        # Пачки по циклам событий: async_to_sync может запускать свои циклы
+        self._batches = {}
+        # Ссылки на задачи отправки, чтобы их не собрал сборщик мусора
+        self._tasks = set()
+
+    def __getattr__(self, name):
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+    async def group_send(self, group, message):
+        loop = asyncio.get_running_loop()
+        batch = self._batches.get(loop)
+        if batch is None:
+            batch = self._batches[loop] = []
+            # Отправка — после уже готовых к запуску задач этого прохода
+            loop.call_soon(self._schedule_flush, loop)
+        future = loop.create_future()
+        batch.append((group, message, future))
+        await future
+
+    def _schedule_flush(self, loop):
+        task = loop.create_task(self._flush(self._batches.pop(loop)))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, batch):
+        items = [(group, message) for group, message, _ in batch]
+        channel_batch_size.observe(len(items), layer=self.layer_name)
+        started = time.perf_counter()
+        try:
+            if hasattr(self.inner, "group_send_many"):
+                sizes = await self.inner.group_send_many(items)
+                results = [None] * len(items)
+            else:
+                sizes = self._local_group_sizes(items)
+                results = await asyncio.gather(
+                    *(self.inner.group_send(group, msg) for group, msg in items),
+                    return_exceptions=True,
+                )
+        except Exception as exc:
+            sizes = []
+            results = [exc] * len(items)
+        channel_send_duration.observe(
+            time.perf_counter() - started, layer=self.layer_name
+        )
+        for size in sizes:
+            channel_group_size.observe(size, layer=self.layer_name)
+
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                # Вызвавшую корутину уже отменили
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(None)
+
+    def _local_group_sizes(self, items):
+        # InMemoryChannelLayer хранит группы в словаре; у других слоёв размеров нет
+        groups = getattr(self.inner, "groups", None)
+        if not isinstance(groups, dict):
+            return []
+        return [len(groups.get(group, ())) for group, _ in items]
@@ -0,0 +1,166 @@
+# core/chat.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .images import variant_url
+from .models import Car, ChatMessage
+
+CAR_CACHE_KEY = "chat:car:{}"
+STAFF_CACHE_KEY = "chat:staff"
+LOAD_CACHE_KEY = "chat:load"
+CUSTOMERS_CACHE_KEY = "chat:customers:{}"
+ROUND_ROBIN_KEY = "chat:round_robin"
+
+
+def get_car_info(car_id):
+    """Данные машины для чата из общего кэша (None — машины нет)."""
+    key = CAR_CACHE_KEY.format(car_id)
+    info = cache.get(key)
+    if info is None:
+        car = Car.objects.filter(id=car_id).first()
+        if car is None:
+            return None
+        info = {"id": car.id, "title": str(car)}
+        cache.set(key, info, settings.CHAT_CACHE_TTL)
+    return info
+
+
+def get_staff_ids():
+    """Id активных менеджеров, которым можно назначать чаты."""
+    staff_ids = cache.get(STAFF_CACHE_KEY)
+    if staff_ids is None:
+        staff_ids = list(
+            User.objects.filter(Q(is_staff=True) | Q(is_superuser=True), is_active=True)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        cache.set(STAFF_CACHE_KEY, staff_ids, settings.CHAT_CACHE_TTL)
+    return staff_ids
+
+
+def invalidate_car(car_id):
+    cache.delete(CAR_CACHE_KEY.format(car_id))
+
+
+def invalidate_staff(user=None):
+    # Обычные пользователи на список менеджеров не влияют
+    if user is not None and not (user.is_staff or user.is_superuser):
+        if user.id not in (cache.get(STAFF_CACHE_KEY) or ()):
+            return
+    cache.delete_many([STAFF_CACHE_KEY, LOAD_CACHE_KEY])
+
+
+# ==============================
+# Стратегии назначения менеджера
+# ==============================
+def assign_first_superuser(staff_ids):
+    # Старое поведение: всё уходит первому суперпользователю
+    return (
+        User.objects.filter(is_superuser=True, id__in=staff_ids)
+        .order_by("id")
+        .values_list("id", flat=True)
+        .first()
+        or staff_ids[0]
+    )
+
+
+def assign_round_robin(staff_ids):
+    # Общий счётчик в кэше — работает и между процессами
+    cache.add(ROUND_ROBIN_KEY, 0, None)
+    try:
+        position = cache.incr(ROUND_ROBIN_KEY)
+    except ValueError:
+        position = 0
+    return staff_ids[position % len(staff_ids)]
+
+
+def assign_least_loaded(staff_ids):
+    # Нагрузка = число сообщений менеджеру за окно CHAT_LOAD_WINDOW;
+    # считается одним GROUP BY и кэшируется на CHAT_LOAD_TTL
+    load = cache.get(LOAD_CACHE_KEY)
+    if load is None:
+        since = timezone.now() - timedelta(hours=settings.CHAT_LOAD_WINDOW)
+        load = dict(
+            ChatMessage.objects.filter(admin_id__in=staff_ids, created_at__gte=since)
+            .values_list("admin_id")
+            .annotate(count=Count("id"))
+            .order_by()
+        )
+    manager_id = min(staff_ids, key=lambda staff_id: (load.get(staff_id, 0), staff_id))
+    # Учитываем назначение сразу, чтобы следующие подключения не шли к тому же
+    load[manager_id] = load.get(manager_id, 0) + 1
+    cache.set(LOAD_CACHE_KEY, load, settings.CHAT_LOAD_TTL)
+    return manager_id
+
+
+STRATEGIES = {
+    "superuser": assign_first_superuser,
+    "round_robin": assign_round_robin,
+    "least_loaded": assign_least_loaded,
+}
+
+
+def assign_manager(car_id, user_id):
+    """Менеджер для чата пользователя по машине.
+
+    Если диалог уже идёт — остаётся прежний менеджер, иначе работает стратегия
+    из CHAT_ASSIGNMENT_STRATEGY.
+    """
+    staff_ids = get_staff_ids()
+    if not staff_ids:
+        return None
+
+    current = (
+        ChatMessage.objects.filter(car_id=car_id, user_id=user_id, admin__isnull=False)
+        .order_by("-created_at")
+        .values_list("admin_id", flat=True)
+        .first()
+    )
+    if current in staff_ids:
+        return current
+
+    return STRATEGIES[settings.CHAT_ASSIGNMENT_STRATEGY](staff_ids)
+
+
+def chat_customers(car_id):
+    """Id покупателей, писавших в чат машины, — адресаты ответов менеджера.
+
+    Множество живёт в общем кэше и пополняется add_chat_customer при первом
+    сообщении собеседника, даже если оно ещё ждёт в буфере отложенной записи;
+    БД читается только при промахе кэша.
+    """
+    key = CUSTOMERS_CACHE_KEY.format(car_id)
+    customers = cache.get(key)
+    if customers is None:
+        customers = set(
+            ChatMessage.objects.filter(car_id=car_id, user__is_staff=False)
+            .order_by()
+            .values_list("user_id", flat=True)
+            .distinct()
+        )
+        cache.add(key, customers, settings.CHAT_CACHE_TTL)
+    return customers
+
+
+def add_chat_customer(car_id, user_id):
+    customers = chat_customers(car_id)
+    if user_id not in customers:
+        # Одновременный первый вход двух покупателей в разных процессах может
+        # потерять одного — до истечения CHAT_CACHE_TTL и перечитывания из БД
+        cache.set(
+            CUSTOMERS_CACHE_KEY.format(car_id),
+            customers | {user_id},
+            settings.CHAT_CACHE_TTL,
+        )
+
+
+def get_user_avatar(user):
+    try:
+        return variant_url(user.profile.avatar, "xs")
+    except Exception:
+        return None
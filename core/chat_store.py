@@ -0,0 +1,246 @@
+# core/chat_store.py
+import asyncio
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .chat import get_user_avatar
+from .models import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+
+class ChatWriteBuffer:
+    """Отложенная (write-behind) запись сообщений чата пачками.
+
+    Сообщения рассылаются сразу, а в БД попадают через bulk_create: по таймеру
+    flush_interval или при накоплении max_size сообщений. Неудачная пачка
+    возвращается в начало очереди и повторяется через flush_interval.
+    """
+
+    def __init__(self, max_size, flush_interval):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._lock = threading.Lock()
+        self._timer = None
+        # Ссылки на задачи записи, чтобы их не собрал сборщик мусора
+        self._tasks = set()
+        self.stats = {
+            "flushed_total": 0,
+            "batches_total": 0,
+            "failed_total": 0,
+            "max_depth": 0,
+            "last_flush_seconds": 0.0,
+        }
+
+    def add(self, message):
+        with self._lock:
+            self._pending.append(message)
+            depth = len(self._pending)
+            self.stats["max_depth"] = max(self.stats["max_depth"], depth)
+
+        loop = asyncio.get_running_loop()
+        if depth >= self.max_size:
+            self._start_flush(loop)
+        else:
+            self._schedule(loop)
+
+    def _schedule(self, loop):
+        with self._lock:
+            if self._timer is None:
+                self._timer = loop.call_later(
+                    self.flush_interval, self._start_flush, loop
+                )
+
+    def _start_flush(self, loop):
+        task = loop.create_task(self.flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush(self):
+        batch = self._take()
+        if batch and not await sync_to_async(self._write)(batch):
+            # Таймер снят в _take — без нового пачка ждала бы следующего сообщения
+            self._schedule(asyncio.get_running_loop())
+
+    def flush_sync(self):
+        # Для остановки процесса, когда цикла событий уже нет
+        batch = self._take()
+        if batch:
+            self._write(batch)
+
+    def _take(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        return batch
+
+    def _write(self, batch):
+        started = time.monotonic()
+        try:
+            ChatMessage.objects.bulk_create(batch, batch_size=500)
+        except Exception:
+            logger.exception("Не удалось записать %s сообщений чата", len(batch))
+            self.stats["failed_total"] += 1
+            # Возвращаем пачку в начало очереди — уйдёт со следующей записью
+            with self._lock:
+                self._pending[:0] = batch
+            return False
+        self.stats["flushed_total"] += len(batch)
+        self.stats["batches_total"] += 1
+        self.stats["last_flush_seconds"] = time.monotonic() - started
+        return True
+
+    def metrics(self):
+        return {"depth": len(self._pending), **self.stats}
+
+
+chat_write_buffer = ChatWriteBuffer(
+    max_size=settings.CHAT_WRITE_BEHIND_BATCH,
+    flush_interval=settings.CHAT_WRITE_BEHIND_INTERVAL,
+)
+
+# Гарантированная запись остатка при остановке процесса
+atexit.register(chat_write_buffer.flush_sync)
+
+
+async def store_message(user, manager_id, car_id, text):
+    """Сохраняет сообщение сразу или через буфер — по CHAT_WRITE_BEHIND."""
+    message = ChatMessage(
+        user=user,
+        admin_id=manager_id,
+        car_id=car_id,
+        message=text,
+        created_at=timezone.now(),
+    )
+    if settings.CHAT_WRITE_BEHIND:
+        chat_write_buffer.add(message)
+    else:
+        await sync_to_async(message.save)()
+    return message
+
+
+# ==============================
+# История комнат: курсорная пагинация и кольцевые буферы «горячих» комнат
+# ==============================
+def serialize_message(message):
+    return {
+        "id": message.id,
+        "message": message.message,
+        "username": message.user.username,
+        "avatar": get_user_avatar(message.user),
+        "timestamp": message.created_at.isoformat(),
+    }
+
+
+def encode_history_cursor(item):
+    # Курсор — самое старое сообщение страницы; у ещё не записанных id нет
+    return f"{item['timestamp']}|{item['id'] or ''}"
+
+
+def decode_history_cursor(cursor):
+    timestamp, _, message_id = str(cursor).partition("|")
+    created_at = parse_datetime(timestamp)
+    if created_at is None:
+        raise ValueError("Некорректный курсор истории")
+    return created_at, int(message_id) if message_id else None
+
+
+class RoomHistoryCache:
+    """Последние сообщения комнат в памяти процесса (LRU по комнатам).
+
+    Хранится не больше size сообщений на комнату и max_rooms комнат; запись
+    живёт ttl секунд, чтобы ограничить расхождение с другими процессами.
+    """
+
+    def __init__(self, size, max_rooms, ttl):
+        self.size = size
+        self.max_rooms = max_rooms
+        self.ttl = ttl
+        self._rooms = OrderedDict()
+
+    def get(self, room):
+        entry = self._rooms.get(room)
+        if entry is None:
+            return None
+        if time.monotonic() - entry["loaded_at"] > self.ttl:
+            del self._rooms[room]
+            return None
+        self._rooms.move_to_end(room)
+        return entry
+
+    def put(self, room, messages, complete):
+        # complete — в БД нет сообщений старше загруженных
+        self._rooms[room] = {
+            "messages": deque(messages, maxlen=self.size),
+            "complete": complete,
+            "loaded_at": time.monotonic(),
+        }
+        self._rooms.move_to_end(room)
+        while len(self._rooms) > self.max_rooms:
+            self._rooms.popitem(last=False)
+
+    def append(self, room, item):
+        entry = self._rooms.get(room)
+        if entry is None:
+            return
+        messages = entry["messages"]
+        if len(messages) == messages.maxlen:
+            entry["complete"] = False
+        messages.append(item)
+
+    def __len__(self):
+        return len(self._rooms)
+
+
+room_history = RoomHistoryCache(
+    size=settings.CHAT_HISTORY_PAGE_SIZE,
+    max_rooms=settings.CHAT_HISTORY_ROOMS,
+    ttl=settings.CHAT_HISTORY_TTL,
+)
+
+
+def fetch_history(car_id, cursor=None, limit=None):
+    """Страница истории из БД: сообщения от старых к новым и курсор на более старые."""
+    limit = limit or settings.CHAT_HISTORY_PAGE_SIZE
+    queryset = ChatMessage.objects.filter(car_id=car_id).select_related(
+        "user", "user__profile"
+    )
+    if cursor:
+        created_at, message_id = decode_history_cursor(cursor)
+        condition = Q(created_at__lt=created_at)
+        if message_id is not None:
+            condition |= Q(created_at=created_at, id__lt=message_id)
+        queryset = queryset.filter(condition)
+
+    rows = list(queryset.order_by("-created_at", "-id")[: limit + 1])
+    has_more = len(rows) > limit
+    messages = [serialize_message(message) for message in reversed(rows[:limit])]
+    next_cursor = encode_history_cursor(messages[0]) if has_more else None
+    return messages, next_cursor
+
+
+async def load_history(car_id, cursor=None):
+    """История комнаты: последняя страница — из памяти, если комната «горячая»."""
+    if cursor is None:
+        entry = room_history.get(car_id)
+        if entry is not None:
+            messages = list(entry["messages"])
+            complete = entry["complete"] or not messages
+            return messages, None if complete else encode_history_cursor(messages[0])
+
+    messages, next_cursor = await sync_to_async(fetch_history)(car_id, cursor)
+    if cursor is None:
+        room_history.put(car_id, messages, complete=next_cursor is None)
+    return messages, next_cursor
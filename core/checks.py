@@ -0,0 +1,28 @@
+# core/checks.py
+"""Проверки настроек при запуске (manage.py check, runserver, daphne)."""
+from django.conf import settings
+from django.core.checks import Warning, register
+
+# Кэши, которые видит только свой процесс
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@register()
+def check_presence_cache(app_configs, **kwargs):
+    # Слой каналов redis — значит, процессов несколько; реестру присутствия
+    # (core/presence.py) тогда нужен общий для них кэш
+    backend = settings.CACHES["default"]["BACKEND"]
+    if settings.CHANNEL_LAYER != "redis" or backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Warning(
+            "Реестр присутствия хранится в кэше процесса: пользователи, "
+            "подключённые к другим процессам, считаются офлайн и не получают "
+            "личных уведомлений.",
+            hint="Задайте CACHE_BACKEND=redis (общий кэш для всех процессов).",
+            id="core.W001",
+        )
+    ]
@@ -1,48 +1,130 @@
 # core/consumers.py
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
-from django.contrib.auth.models import User
 from asgiref.sync import sync_to_async
-from .models import ChatMessage, Car, Order
+from django.conf import settings
+from .broadcast import shard_group
+from . import presence
+from .chat import (
+    add_chat_customer,
+    assign_manager,
+    chat_customers,
+    get_car_info,
+    get_user_avatar,
+)
+from .chat_store import chat_write_buffer, load_history, room_history, store_message
+from .metrics import ConsumerMetricsMixin
 
 
-class ChatConsumer(AsyncWebsocketConsumer):
+class ChatConsumer(ConsumerMetricsMixin, AsyncWebsocketConsumer):
     async def connect(self):
         self.car_id = self.scope["url_route"]["kwargs"]["car_id"]
         self.room_group_name = f"chat_{self.car_id}"
 
+        # Машину, менеджера и аватар определяем один раз на соединение,
+        # а не на каждое сообщение
+        self.car = await sync_to_async(get_car_info)(self.car_id)
+        if self.car is None:
+            await self.close()
+            return
+
+        user = self.scope["user"]
+        self.manager_id = None
+        self.avatar = None
+        # Покупатель попадает в адресаты ответов менеджера с первым сообщением
+        self.customer_added = False
+        if user.is_authenticated:
+            self.manager_id = await sync_to_async(assign_manager)(self.car_id, user.id)
+            self.avatar = await sync_to_async(get_user_avatar)(user)
+
         # Присоединиться к группе чата
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
 
         await self.accept()
 
+        # Сразу отдаём последние сообщения комнаты
+        await self.send_history()
+
+    async def send_history(self, cursor=None):
+        try:
+            messages, next_cursor = await load_history(self.car_id, cursor)
+        except ValueError as exc:
+            await self.send(text_data=json.dumps({"type": "error", "error": str(exc)}))
+            return
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "type": "history",
+                    "messages": messages,
+                    "cursor": next_cursor,
+                    "older": cursor is not None,
+                }
+            )
+        )
+
     async def disconnect(self, close_code):
         # Покинуть группу чата
         await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
 
+        # Отложенные сообщения не должны пережить соединение
+        if settings.CHAT_WRITE_BEHIND:
+            await chat_write_buffer.flush()
+
     # Не закрывать соединение принудительно — оно закроется само при закрытии вкладки
 
     async def receive(self, text_data):
         data = json.loads(text_data)
+
+        # Подгрузка более старых сообщений по курсору
+        if data.get("action") == "load_more":
+            await self.send_history(data.get("cursor") or None)
+            return
+
         message = data["message"]
         user = self.scope["user"]
 
         if not user.is_authenticated:
             return
 
-        # Сохранить сообщение в БД
-        chat_message = await self.save_message(user, message)
+        # Сохранить сообщение в БД (сразу или через буфер отложенной записи)
+        chat_message = await store_message(
+            user, self.manager_id, self.car_id, message
+        )
+
+        item = {
+            "id": chat_message.id,
+            "message": message,
+            "username": user.username,
+            "avatar": self.avatar,
+            "timestamp": chat_message.created_at.isoformat(),
+        }
+        room_history.append(self.car_id, item)
+
+        if not user.is_staff and not self.customer_added:
+            await sync_to_async(add_chat_customer)(self.car_id, user.id)
+            self.customer_added = True
 
         # Отправить сообщение всем в группе
         await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                "type": "chat_message",
-                "message": message,
-                "username": user.username,
-                "avatar": await self.get_user_avatar(user),
-                "timestamp": chat_message.created_at.isoformat(),
-            },
+            self.room_group_name, {"type": "chat_message", **item}
+        )
+
+        # Ответ менеджера — покупателям этого чата, даже если чат у них закрыт
+        if user.is_staff:
+            await self.notify_customers(user, item)
+
+    async def notify_customers(self, user, item):
+        customers = await sync_to_async(chat_customers)(self.car_id)
+        event = {
+            "type": "chat_reply",
+            "car_id": self.car["id"],
+            "car": self.car["title"],
+            "message": item["message"],
+            "username": item["username"],
+            "timestamp": item["timestamp"],
+        }
+        await presence.send_to_users(
+            {customer: [event] for customer in customers if customer != user.id}
         )
 
     async def chat_message(self, event):
@@ -50,6 +132,8 @@ class ChatConsumer(AsyncWebsocketConsumer):
         await self.send(
             text_data=json.dumps(
                 {
+                    "type": "chat_message",
+                    "id": event["id"],
                     "message": event["message"],
                     "username": event["username"],
                     "avatar": event["avatar"],
@@ -58,24 +142,8 @@ class ChatConsumer(AsyncWebsocketConsumer):
             )
         )
 
-    @sync_to_async
-    def save_message(self, user, message):
-        # Найти администратора (первого суперпользователя)
-        admin = User.objects.filter(is_superuser=True).first()
-        car = Car.objects.get(id=self.car_id)
-        return ChatMessage.objects.create(
-            user=user, admin=admin, message=message, car=car
-        )
-
-    @sync_to_async
-    def get_user_avatar(self, user):
-        try:
-            return user.profile.avatar.url if user.profile.avatar else None
-        except:
-            return None
-
 
-class NotificationConsumer(AsyncWebsocketConsumer):
+class NotificationConsumer(ConsumerMetricsMixin, AsyncWebsocketConsumer):
     async def connect(self):
         if not self.scope["user"].is_staff:
             await self.close()
@@ -101,17 +169,167 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             )
         )
 
+    async def orders_status_changed(self, event):
+        # Одно событие на всё массовое действие, а не на каждую заявку
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "type": "orders_status_changed",
+                    "status": event["status"],
+                    "changed_by": event["changed_by"],
+                    "orders": event["orders"],
+                }
+            )
+        )
+
+
+class UserNotificationConsumer(ConsumerMetricsMixin, AsyncWebsocketConsumer):
+    """Личные уведомления покупателя: заявки, ответы в чате, избранное.
+
+    Соединение входит в группу user_{id} и отмечается в реестре присутствия;
+    клиент раз в PRESENCE_HEARTBEAT секунд присылает {"action": "ping"}.
+    """
 
-class CarConsumer(AsyncWebsocketConsumer):
     async def connect(self):
-        self.group_name = "car_updates"
+        user = self.scope["user"]
+        if not user.is_authenticated:
+            await self.close()
+            return
+
+        self.user_id = user.id
+        self.group_name = presence.user_group(user.id)
         await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await sync_to_async(presence.connect)(self.user_id)
         await self.accept()
+        await self.send(
+            text_data=json.dumps(
+                {"type": "welcome", "heartbeat": settings.PRESENCE_HEARTBEAT}
+            )
+        )
 
     async def disconnect(self, close_code):
+        if not hasattr(self, "group_name"):
+            return
+        await sync_to_async(presence.disconnect)(self.user_id)
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
 
+    async def receive(self, text_data):
+        # Любое сообщение клиента продлевает присутствие
+        await sync_to_async(presence.heartbeat)(self.user_id)
+
+    async def order_status(self, event):
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "type": "order_status",
+                    "order_id": event["order_id"],
+                    "car": event["car"],
+                    "status": event["status"],
+                    "status_label": event["status_label"],
+                    "previous": event["previous"],
+                }
+            )
+        )
+
+    async def chat_reply(self, event):
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "type": "chat_reply",
+                    "car_id": event["car_id"],
+                    "car": event["car"],
+                    "message": event["message"],
+                    "username": event["username"],
+                    "timestamp": event["timestamp"],
+                }
+            )
+        )
+
+    async def price_drop(self, event):
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "type": "price_drop",
+                    "car_id": event["car_id"],
+                    "car": event["car"],
+                    "old_price": event["old_price"],
+                    "price": event["price"],
+                }
+            )
+        )
+
+    async def back_in_stock(self, event):
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "type": "back_in_stock",
+                    "car_id": event["car_id"],
+                    "car": event["car"],
+                    "price": event["price"],
+                }
+            )
+        )
+
+
+class CarConsumer(ConsumerMetricsMixin, AsyncWebsocketConsumer):
+    """Обновления цены и статуса машин, на которые подписан клиент.
+
+    Клиент присылает {"action": "subscribe" | "unsubscribe", "car_ids": [...]};
+    соединение входит только в группы шардов этих машин, а лишнее из кадров
+    шарда отбрасывается здесь же.
+    """
+
+    async def connect(self):
+        self.car_ids = set()
+        self.groups_joined = set()
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        for group in self.groups_joined:
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def receive(self, text_data):
+        try:
+            data = json.loads(text_data)
+            action = data["action"]
+            car_ids = {int(car_id) for car_id in data["car_ids"]}
+        except (ValueError, TypeError, KeyError):
+            await self.send_error("Ожидается {action, car_ids}")
+            return
+
+        if action == "subscribe":
+            car_ids |= self.car_ids
+        elif action == "unsubscribe":
+            car_ids = self.car_ids - car_ids
+        else:
+            await self.send_error(f"Неизвестное действие: {action}")
+            return
+
+        if len(car_ids) > settings.CAR_UPDATES_MAX_SUBSCRIPTIONS:
+            await self.send_error("Слишком много машин в подписке")
+            return
+        await self.update_groups(car_ids)
+        await self.send(
+            text_data=json.dumps(
+                {"type": "subscribed", "car_ids": sorted(self.car_ids)}
+            )
+        )
+
+    async def update_groups(self, car_ids):
+        groups = {shard_group(car_id) for car_id in car_ids}
+        for group in groups - self.groups_joined:
+            await self.channel_layer.group_add(group, self.channel_name)
+        for group in self.groups_joined - groups:
+            await self.channel_layer.group_discard(group, self.channel_name)
+        self.car_ids = car_ids
+        self.groups_joined = groups
+
+    async def send_error(self, error):
+        await self.send(text_data=json.dumps({"type": "error", "error": error}))
+
     async def car_updated(self, event):
+        if event["car_id"] not in self.car_ids:
+            return
         await self.send(
             text_data=json.dumps(
                 {
@@ -122,3 +340,11 @@ class CarConsumer(AsyncWebsocketConsumer):
                 }
             )
         )
+
+    async def cars_updated(self, event):
+        # Кадр шарда за окно склейки: оставляем только машины подписки
+        cars = [car for car in event["cars"] if car["car_id"] in self.car_ids]
+        if cars:
+            await self.send(
+                text_data=json.dumps({"type": "cars_updated", "cars": cars})
+            )
@@ -0,0 +1,93 @@
+# core/counters.py
+"""Денормализованные счётчики популярности машин: просмотры, избранное, заявки.
+
+Меняются атомарным UPDATE ... SET x = x + n при создании и удалении строк;
+удаление пользователя вычитает все его строки разом, по одному GROUP BY
+на вид строк.
+Расхождения (гонки с ignore_conflicts, смена машины в заявке, правка БД
+руками) исправляет команда reconcile_car_counters.
+"""
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .models import COUNTER_FIELDS, Car, Favorite, Order, ViewHistory
+
+# Модель строк -> поле счётчика в Car
+COUNTERS = {
+    ViewHistory: "views_count",
+    Favorite: "favorites_count",
+    Order: "orders_count",
+}
+
+
+def adjust(field, car_ids, delta=1):
+    """Прибавляет delta к счётчику каждой машины из car_ids (с повторами).
+
+    Машины с одинаковым итоговым приращением обновляются одним запросом.
+    """
+    _adjust_counts(field, Counter(car_ids), delta)
+
+
+def _adjust_counts(field, counts, delta):
+    by_delta = defaultdict(list)
+    for car_id, count in counts.items():
+        by_delta[count * delta].append(car_id)
+    for amount, ids in by_delta.items():
+        if not amount:
+            continue
+        value = F(field) + amount
+        if amount < 0:
+            # Счётчик мог разойтись с данными — не уходим ниже нуля
+            value = Greatest(value, 0)
+        Car.objects.filter(id__in=ids).update_counters(**{field: value})
+
+
+def release_user(user_id):
+    """Вычитает из счётчиков машин все строки пользователя — перед его удалением."""
+    for model, field in COUNTERS.items():
+        counts = dict(
+            model.objects.filter(user_id=user_id)
+            .order_by()
+            .values("car_id")
+            .annotate(count=Count("id"))
+            .values_list("car_id", "count")
+        )
+        _adjust_counts(field, counts, -1)
+
+
+def reconcile(batch_size=1000):
+    """Пересчитывает счётчики по исходным таблицам пачками по batch_size машин.
+
+    Возвращает число машин, у которых счётчики разошлись с данными.
+    """
+    fixed = 0
+    last_id = 0
+    fields = ["id", *COUNTERS.values()]
+    while True:
+        cars = list(
+            Car.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list(*fields)[:batch_size]
+        )
+        if not cars:
+            return fixed
+        last_id = cars[-1][0]
+        car_ids = [row[0] for row in cars]
+
+        actual = {}
+        for model, field in COUNTERS.items():
+            actual[field] = dict(
+                model.objects.filter(car_id__in=car_ids)
+                .order_by()
+                .values("car_id")
+                .annotate(count=Count("id"))
+                .values_list("car_id", "count")
+            )
+
+        for car_id, *stored in cars:
+            values = {field: actual[field].get(car_id, 0) for field in COUNTER_FIELDS}
+            if values != dict(zip(fields[1:], stored)):
+                Car.objects.filter(id=car_id).update_counters(**values)
+                fixed += 1
@@ -0,0 +1,80 @@
+# core/db_routing.py
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Запрос только читает и разрешил реплику (ставит ReplicaReadMiddleware)
+_use_replica = ContextVar("use_replica", default=False)
+
+PIN_COOKIE = "db_primary"
+SAFE_METHODS = ("GET", "HEAD")
+
+
+def replica_configured():
+    return "replica" in settings.DATABASES
+
+
+class ReplicaRouter:
+    """Чтения в помеченных запросах — в реплику, всё остальное — в основную БД."""
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if _use_replica.get() and replica_configured():
+            return "replica"
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика — копия основной БД, связи между ними допустимы
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
+
+
+class ReplicaReadMiddleware:
+    """Включает реплику для GET-запросов к REPLICA_VIEWS и спискам админки.
+
+    После записи (не-GET запрос) пользователь REPLICA_PIN_SECONDS секунд
+    читает с основной БД, чтобы сразу видеть свои изменения.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _use_replica.set(False)
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+        if (
+            request.method not in SAFE_METHODS
+            and settings.REPLICA_PIN_SECONDS
+            and replica_configured()
+        ):
+            response.set_cookie(
+                PIN_COOKIE, "1", max_age=settings.REPLICA_PIN_SECONDS, httponly=True
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            request.method in SAFE_METHODS
+            and PIN_COOKIE not in request.COOKIES
+            and _reads_from_replica(request.resolver_match)
+        ):
+            _use_replica.set(True)
+        return None
+
+
+def _reads_from_replica(match):
+    if match is None or not match.url_name:
+        return False
+    if match.namespace == "admin":
+        return match.url_name.endswith("_changelist")
+    return match.url_name in settings.REPLICA_VIEWS
@@ -0,0 +1,91 @@
+# core/filters.py
+from django.db.models import Count, Q
+
+from .models import Car
+
+# Границы корзин для фасетов-диапазонов: [min, max), None — без верхней границы
+PRICE_BUCKETS = [
+    (0, 500_000),
+    (500_000, 1_000_000),
+    (1_000_000, 2_000_000),
+    (2_000_000, 5_000_000),
+    (5_000_000, None),
+]
+MILEAGE_BUCKETS = [
+    (0, 10_000),
+    (10_000, 50_000),
+    (50_000, 100_000),
+    (100_000, 200_000),
+    (200_000, None),
+]
+
+# Поле формы -> (фасет, к которому оно относится, ORM-lookup)
+FILTER_LOOKUPS = {
+    "brand": ("brand", "brand"),
+    "model": ("model", "model"),
+    "color": ("color", "color"),
+    "year_min": ("year", "year__gte"),
+    "year_max": ("year", "year__lte"),
+    "price_min": ("price", "price__gte"),
+    "price_max": ("price", "price__lte"),
+    "mileage_min": ("mileage", "mileage__gte"),
+    "mileage_max": ("mileage", "mileage__lte"),
+}
+
+
+def available_cars():
+    return Car.objects.filter(status="available")
+
+
+def filter_cars(queryset, params, exclude_facet=None):
+    """Применяет фильтры из cleaned_data формы CarFilterForm.
+
+    exclude_facet — фасет, свои условия которого не применяются: так счётчики
+    по марке показывают, сколько машин будет при выборе другой марки.
+    """
+    conditions = {}
+    for key, (facet, lookup) in FILTER_LOOKUPS.items():
+        value = params.get(key)
+        if value in (None, "") or facet == exclude_facet:
+            continue
+        conditions[lookup] = value
+    return queryset.filter(**conditions)
+
+
+def _value_facet(queryset, field):
+    # SELECT field, COUNT(id) ... GROUP BY field
+    rows = queryset.values(field).annotate(count=Count("id")).order_by(field)
+    return [{"value": row[field], "count": row["count"]} for row in rows]
+
+
+def _bucket_facet(queryset, field, buckets):
+    # Все корзины считаются одним запросом через COUNT(...) FILTER (WHERE ...)
+    aggregates = {}
+    for index, (low, high) in enumerate(buckets):
+        condition = Q(**{f"{field}__gte": low})
+        if high is not None:
+            condition &= Q(**{f"{field}__lt": high})
+        aggregates[f"bucket_{index}"] = Count("id", filter=condition)
+    counts = queryset.aggregate(**aggregates)
+    return [
+        {"min": low, "max": high, "count": counts[f"bucket_{index}"]}
+        for index, (low, high) in enumerate(buckets)
+    ]
+
+
+def compute_facets(params, queryset=None):
+    """Счётчики по фасетам: по одному агрегирующему запросу на группу."""
+    if queryset is None:
+        queryset = available_cars()
+    return {
+        "brand": _value_facet(filter_cars(queryset, params, "brand"), "brand"),
+        "model": _value_facet(filter_cars(queryset, params, "model"), "model"),
+        "color": _value_facet(filter_cars(queryset, params, "color"), "color"),
+        "year": _value_facet(filter_cars(queryset, params, "year"), "year"),
+        "price": _bucket_facet(
+            filter_cars(queryset, params, "price"), "price", PRICE_BUCKETS
+        ),
+        "mileage": _bucket_facet(
+            filter_cars(queryset, params, "mileage"), "mileage", MILEAGE_BUCKETS
+        ),
+    }
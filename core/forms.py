@@ -1,5 +1,9 @@
+import datetime
+
 from django import forms
-from .models import Order
+from django.utils import timezone
+from .models import Car, Order
+from .orders import STATUS_LABELS, can_transition
 
 
 class OrderForm(forms.ModelForm):
@@ -18,3 +22,147 @@ class OrderForm(forms.ModelForm):
         labels = {
             "comment": "Комментарий",
         }
+
+
+class OrderAdminForm(forms.ModelForm):
+    """Статус заявки меняется только по допустимым переходам (core/orders.py)."""
+
+    class Meta:
+        model = Order
+        fields = "__all__"
+
+    def clean_status(self):
+        status = self.cleaned_data["status"]
+        previous = self.instance.status if self.instance.pk else None
+        if previous and previous != status and not can_transition(previous, status):
+            raise forms.ValidationError(
+                f"Нельзя сменить статус «{STATUS_LABELS[previous]}» "
+                f"на «{STATUS_LABELS[status]}»."
+            )
+        return status
+
+
+class CarFilterForm(forms.Form):
+    brand = forms.CharField(
+        required=False,
+        label="Марка",
+        widget=forms.TextInput(attrs={"class": "form-control", "placeholder": "Марка"}),
+    )
+    model = forms.CharField(
+        required=False,
+        label="Модель",
+        widget=forms.TextInput(attrs={"class": "form-control", "placeholder": "Модель"}),
+    )
+    color = forms.CharField(
+        required=False,
+        label="Цвет",
+        widget=forms.TextInput(attrs={"class": "form-control", "placeholder": "Цвет"}),
+    )
+    year_min = forms.IntegerField(
+        required=False,
+        min_value=0,
+        label="Год от",
+        widget=forms.NumberInput(attrs={"class": "form-control", "placeholder": "Год от"}),
+    )
+    year_max = forms.IntegerField(
+        required=False,
+        min_value=0,
+        label="Год до",
+        widget=forms.NumberInput(attrs={"class": "form-control", "placeholder": "Год до"}),
+    )
+    price_min = forms.DecimalField(
+        required=False,
+        min_value=0,
+        label="Цена от",
+        widget=forms.NumberInput(attrs={"class": "form-control", "placeholder": "Цена от"}),
+    )
+    price_max = forms.DecimalField(
+        required=False,
+        min_value=0,
+        label="Цена до",
+        widget=forms.NumberInput(attrs={"class": "form-control", "placeholder": "Цена до"}),
+    )
+    mileage_min = forms.IntegerField(
+        required=False,
+        min_value=0,
+        label="Пробег от",
+        widget=forms.NumberInput(
+            attrs={"class": "form-control", "placeholder": "Пробег от"}
+        ),
+    )
+    mileage_max = forms.IntegerField(
+        required=False,
+        min_value=0,
+        label="Пробег до",
+        widget=forms.NumberInput(
+            attrs={"class": "form-control", "placeholder": "Пробег до"}
+        ),
+    )
+    sort = forms.ChoiceField(
+        required=False,
+        choices=[("", "Сначала новые"), ("popular", "Популярные")],
+        label="Сортировка",
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for name in ("year", "price", "mileage"):
+            low = cleaned_data.get(f"{name}_min")
+            high = cleaned_data.get(f"{name}_max")
+            if low is not None and high is not None and low > high:
+                self.add_error(f"{name}_max", "Верхняя граница меньше нижней.")
+        return cleaned_data
+
+
+class CarImportForm(forms.ModelForm):
+    """Проверка одной строки файла остатков (см. core/inventory.py)."""
+
+    class Meta:
+        model = Car
+        fields = [
+            "vin",
+            "brand",
+            "model",
+            "year",
+            "mileage",
+            "color",
+            "price",
+            "description",
+            "status",
+        ]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["vin"].required = True
+        self.fields["status"].required = False
+
+    def clean_status(self):
+        return self.cleaned_data["status"] or "available"
+
+    def validate_unique(self):
+        # Уникальность VIN обеспечивает upsert по VIN, а не запрос на каждую строку
+        pass
+
+
+class InventoryUploadForm(forms.Form):
+    file = forms.FileField(label="Файл CSV или JSONL")
+
+
+class AnalyticsPeriodForm(forms.Form):
+    DEFAULT_DAYS = 30
+
+    start = forms.DateField(
+        required=False, label="С", widget=forms.DateInput(attrs={"type": "date"})
+    )
+    end = forms.DateField(
+        required=False, label="По", widget=forms.DateInput(attrs={"type": "date"})
+    )
+
+    def period(self):
+        """(начало, конец) отчёта; по умолчанию — последние DEFAULT_DAYS дней."""
+        data = self.cleaned_data if self.is_bound and self.is_valid() else {}
+        end = data.get("end") or timezone.localdate()
+        default_start = end - datetime.timedelta(days=self.DEFAULT_DAYS - 1)
+        start = data.get("start") or default_start
+        return min(start, end), max(start, end)
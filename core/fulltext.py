@@ -0,0 +1,229 @@
+# core/fulltext.py
+"""Полнотекстовый поиск по автомобилям и новостям.
+
+SQLite: виртуальные таблицы FTS5 (rowid = id объекта), ранжирование bm25.
+PostgreSQL: таблицы с колонкой tsvector и GIN-индексом, ранжирование ts_rank.
+Остальные СУБД — запасной вариант через icontains.
+На обеих СУБД запрос — все слова сразу, каждое как префикс («тойот» найдёт
+«Тойота»); операторы вроде OR и минуса не поддерживаются.
+Таблицы создаёт миграция 0004_search_index, синхронизацию ведут сигналы.
+"""
+import itertools
+import re
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Car, News
+
+# Вид документа -> (модель, таблица индекса, поля заголовка, поля текста)
+INDEXES = {
+    "car": (Car, "core_search_car", ("brand", "model"), ("description",)),
+    "news": (News, "core_search_news", ("title",), ("content",)),
+}
+
+KIND_BY_MODEL = {model: kind for kind, (model, *_rest) in INDEXES.items()}
+# Поля, от которых зависит документ: правка других полей индекс не трогает
+INDEXED_FIELDS = {
+    model: {*title_fields, *body_fields}
+    for model, _table, title_fields, body_fields in INDEXES.values()
+}
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _document(kind, obj):
+    _model, _table, title_fields, body_fields = INDEXES[kind]
+    title = " ".join(str(getattr(obj, name) or "") for name in title_fields)
+    body = " ".join(str(getattr(obj, name) or "") for name in body_fields)
+    return title, body
+
+
+def _fts5_query(query):
+    # Каждое слово — в кавычках (экранирование синтаксиса FTS5) и с префиксным *
+    words = WORD_RE.findall(query)
+    return " ".join('"%s"*' % word for word in words)
+
+
+def _tsquery(query):
+    # То же для to_tsquery: слова через & с префиксным :*; в словах только \w,
+    # так что синтаксис tsquery в них не попадёт
+    words = WORD_RE.findall(query)
+    return " & ".join("%s:*" % word for word in words)
+
+
+def index_object(obj):
+    index_objects([obj])
+
+
+def index_objects(objs):
+    """Индексирует объекты одной модели пачкой: запрос-два на всю пачку."""
+    objs = list(objs)
+    if not objs:
+        return
+    kind = KIND_BY_MODEL[type(objs[0])]
+    _model, table, _title, _body = INDEXES[kind]
+    rows = [(obj.pk, *_document(kind, obj)) for obj in objs]
+    connection = connections[router.db_for_write(type(objs[0]))]
+
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            # У FTS5 нет UPSERT: удаляем прежние документы и вставляем заново
+            cursor.executemany(
+                f"DELETE FROM {table} WHERE rowid = %s",
+                [(pk,) for pk, _title, _body in rows],
+            )
+            cursor.executemany(
+                f"INSERT INTO {table} (rowid, title, body) VALUES (%s, %s, %s)",
+                rows,
+            )
+        elif connection.vendor == "postgresql":
+            cursor.executemany(
+                f"INSERT INTO {table} (object_id, document) VALUES ("
+                "%s, setweight(to_tsvector(%s, %s), 'A')"
+                " || setweight(to_tsvector(%s, %s), 'B'))"
+                " ON CONFLICT (object_id) DO UPDATE SET document = EXCLUDED.document",
+                [
+                    (pk, settings.SEARCH_CONFIG, title, settings.SEARCH_CONFIG, body)
+                    for pk, title, body in rows
+                ],
+            )
+
+
+def reindex(model, ids):
+    """Переиндексирует объекты по id — после массовых записей без post_save."""
+    objs = (
+        model.objects.filter(pk__in=ids)
+        .only("pk", *INDEXED_FIELDS[model])
+        .iterator(chunk_size=1000)
+    )
+    while chunk := list(itertools.islice(objs, 1000)):
+        index_objects(chunk)
+
+
+def unindex_object(obj):
+    kind = KIND_BY_MODEL[type(obj)]
+    _model, table, _title, _body = INDEXES[kind]
+    connection = connections[router.db_for_write(type(obj))]
+
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(f"DELETE FROM {table} WHERE rowid = %s", [obj.pk])
+        elif connection.vendor == "postgresql":
+            cursor.execute(f"DELETE FROM {table} WHERE object_id = %s", [obj.pk])
+
+
+def rebuild_index(kind):
+    model, table, _title, _body = INDEXES[kind]
+    connection = connections[router.db_for_write(model)]
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table}")
+    count = 0
+    objs = model.objects.iterator(chunk_size=1000)
+    while chunk := list(itertools.islice(objs, 1000)):
+        index_objects(chunk)
+        count += len(chunk)
+    return count
+
+
+def _restriction(queryset, connection, column):
+    # Условие «id из queryset» внутри запроса к индексу: ранжирование и лимит
+    # тогда считаются только среди подходящих объектов
+    if queryset is None:
+        return "", []
+    sql, params = (
+        queryset.order_by().values("pk").query.get_compiler(connection=connection)
+    ).as_sql()
+    return f" AND {column} IN ({sql})", list(params)
+
+
+def search_ids(kind, query, limit=None, queryset=None):
+    """Id объектов, подходящих под запрос, по убыванию релевантности.
+
+    queryset сужает поиск до своих объектов до ранжирования и лимита.
+    """
+    model, table, title_fields, body_fields = INDEXES[kind]
+    limit = limit or settings.SEARCH_MAX_RESULTS
+    if queryset is not None:
+        connection = connections[queryset.db]
+    else:
+        connection = connections[router.db_for_read(model)]
+
+    if connection.vendor == "sqlite":
+        match = _fts5_query(query)
+        if not match:
+            return []
+        restriction, restriction_params = _restriction(queryset, connection, "rowid")
+        sql = (
+            f"SELECT rowid FROM {table} WHERE {table} MATCH %s{restriction}"
+            f" ORDER BY bm25({table}, 10.0, 1.0) LIMIT %s"
+        )
+        params = [match, *restriction_params, limit]
+    elif connection.vendor == "postgresql":
+        match = _tsquery(query)
+        if not match:
+            return []
+        restriction, restriction_params = _restriction(
+            queryset, connection, "object_id"
+        )
+        sql = (
+            f"SELECT object_id FROM {table},"
+            " to_tsquery(%s, %s) AS query"
+            f" WHERE document @@ query{restriction}"
+            " ORDER BY ts_rank(document, query) DESC LIMIT %s"
+        )
+        params = [settings.SEARCH_CONFIG, match, *restriction_params, limit]
+    else:
+        base = queryset if queryset is not None else model.objects.all()
+        return list(
+            base.filter(_contains(title_fields + body_fields, query)).values_list(
+                "pk", flat=True
+            )[:limit]
+        )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _contains(fields, query):
+    condition = Q()
+    for name in fields:
+        condition |= Q(**{f"{name}__icontains": query})
+    return condition
+
+
+def filter_matching(queryset, query):
+    """queryset, суженный до подходящих под запрос объектов, — без лимита.
+
+    Для админки: порядок и пагинация остаются за changelist, а id подходящих
+    объектов берутся подзапросом к индексу, а не списком из SEARCH_MAX_RESULTS.
+    """
+    _model, table, title_fields, body_fields = INDEXES[KIND_BY_MODEL[queryset.model]]
+    vendor = connections[queryset.db].vendor
+
+    if vendor == "sqlite":
+        match = _fts5_query(query)
+        if not match:
+            return queryset.none()
+        matching = RawSQL(f"SELECT rowid FROM {table} WHERE {table} MATCH %s", [match])
+    elif vendor == "postgresql":
+        match = _tsquery(query)
+        if not match:
+            return queryset.none()
+        matching = RawSQL(
+            f"SELECT object_id FROM {table} WHERE document @@ to_tsquery(%s, %s)",
+            [settings.SEARCH_CONFIG, match],
+        )
+    else:
+        return queryset.filter(_contains(title_fields + body_fields, query))
+    return queryset.filter(pk__in=matching)
+
+
+def search(queryset, query, limit=None):
+    """Объекты queryset, подходящие под запрос, в порядке релевантности."""
+    ids = search_ids(KIND_BY_MODEL[queryset.model], query, limit, queryset=queryset)
+    objects = queryset.in_bulk(ids)
+    return [objects[pk] for pk in ids if pk in objects]
@@ -0,0 +1,176 @@
+# core/images.py
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# Варианты: максимальные ширина и высота (пропорции сохраняются, без увеличения)
+VARIANTS = {
+    "xs": (100, 100),
+    "sm": (400, 300),
+    "md": (800, 600),
+}
+# Форматы: WebP для браузеров, которые его понимают, JPEG — запасной
+FORMATS = {
+    "webp": ("WEBP", {"method": 4}),
+    "jpeg": ("JPEG", {"optimize": True, "progressive": True}),
+}
+
+# Готовность вариантов файла в кэше: рендер не спрашивает хранилище (stat или
+# HEAD на S3) на каждую картинку. Ключ ставит построитель; «ещё нет» помним
+# недолго — варианты может достроить пул
+READY_KEY = "images:ready:{}"
+MISSING_TTL = 60
+
+# Поля с изображениями, для которых строятся варианты
+IMAGE_FIELDS = (
+    ("core.Car", "photo"),
+    ("core.News", "image"),
+    ("core.UserProfile", "avatar"),
+)
+
+
+def derivative_name(name, variant, fmt):
+    """cars/abc.png -> cars/derivatives/abc_sm.webp"""
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    extension = "jpg" if fmt == "jpeg" else fmt
+    return os.path.join(directory, "derivatives", f"{stem}_{variant}.{extension}")
+
+
+def _encode(image, fmt):
+    pil_format, options = FORMATS[fmt]
+    if fmt == "jpeg" and image.mode == "RGBA":
+        # У JPEG нет прозрачности — кладём на белый фон
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    buffer = BytesIO()
+    image.save(buffer, pil_format, quality=settings.IMAGE_QUALITY, **options)
+    return buffer.getvalue()
+
+
+def _ready_key(name):
+    return READY_KEY.format(hashlib.md5(name.encode()).hexdigest())
+
+
+def variants_ready(name):
+    """Построены ли варианты файла: из кэша, хранилище — только при промахе."""
+    key = _ready_key(name)
+    ready = cache.get(key)
+    if ready is None:
+        # Последним пишется md/jpeg — по нему судим, что построены все
+        ready = default_storage.exists(derivative_name(name, "md", "jpeg"))
+        cache.set(key, ready, None if ready else MISSING_TTL)
+    return ready
+
+
+def generate_derivatives(name, force=False, storage=default_storage):
+    """Строит все варианты одного файла. Возвращает число записанных файлов."""
+    if not force and storage.exists(derivative_name(name, "md", "jpeg")):
+        cache.set(_ready_key(name), True, None)
+        return 0
+    try:
+        with storage.open(name, "rb") as source:
+            original = Image.open(source)
+            original.load()
+    except (FileNotFoundError, UnidentifiedImageError, OSError):
+        logger.warning("Не удалось открыть изображение %s", name)
+        return 0
+
+    # Учитываем поворот из EXIF, иначе фото с телефона лягут набок
+    original = ImageOps.exif_transpose(original)
+    if original.mode not in ("RGB", "RGBA"):
+        has_alpha = original.mode in ("LA", "PA") or "transparency" in original.info
+        original = original.convert("RGBA" if has_alpha else "RGB")
+
+    written = 0
+    for variant, size in VARIANTS.items():
+        image = original.copy()
+        image.thumbnail(size, Image.Resampling.LANCZOS)
+        for fmt in FORMATS:
+            target = derivative_name(name, variant, fmt)
+            if storage.exists(target):
+                storage.delete(target)
+            storage.save(target, ContentFile(_encode(image, fmt)))
+            written += 1
+    cache.set(_ready_key(name), True, None)
+    return written
+
+
+def variant_urls(field, variant):
+    """{"webp": url, "jpeg": url} варианта или None, пока он не построен."""
+    if not field:
+        return None
+    if not variants_ready(field.name):
+        return None
+    return {
+        fmt: default_storage.url(derivative_name(field.name, variant, fmt))
+        for fmt in FORMATS
+    }
+
+
+def variant_url(field, variant, fmt="jpeg"):
+    """URL варианта изображения; пока вариант не построен — оригинал."""
+    if not field:
+        return None
+    urls = variant_urls(field, variant)
+    return urls[fmt] if urls else field.url
+
+
+# ==============================
+# Фоновая генерация
+# ==============================
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS, thread_name_prefix="images"
+            )
+        return _executor
+
+
+def _run(name, on_done):
+    try:
+        if generate_derivatives(name) and on_done is not None:
+            on_done()
+    except Exception:
+        logger.exception("Ошибка при построении вариантов %s", name)
+
+
+def _run_in_worker(name, on_done):
+    try:
+        _run(name, on_done)
+    finally:
+        # Соединение с БД в потоке пула — своё, закрываем его сами
+        connection.close()
+
+
+def schedule_derivatives(name, on_done=None):
+    """После коммита отдаёт файл пулу потоков; IMAGE_WORKERS=0 — прямо в запросе."""
+    if not name:
+        return
+
+    def submit():
+        if settings.IMAGE_WORKERS <= 0:
+            _run(name, on_done)
+        else:
+            get_executor().submit(_run_in_worker, name, on_done)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,212 @@
+# core/inventory.py
+"""Импорт остатков от поставщиков (CSV/JSONL) и потоковая выгрузка в CSV/JSONL.
+
+Файл читается построчно и обрабатывается пачками: на пачку — один SELECT по
+VIN, один bulk_create, один bulk_update и одна запись в полнотекстовый индекс,
+так что размер файла ограничен только диском, а не памятью.
+"""
+import copy
+import csv
+import io
+import itertools
+import json
+
+from django.conf import settings
+from django.db import transaction
+from django.forms.models import model_to_dict
+from django.http import StreamingHttpResponse
+
+from .forms import CarImportForm
+from .models import Car, cars_updated, normalize_vin
+
+IMPORT_FIELDS = CarImportForm.Meta.fields
+UPDATE_FIELDS = [name for name in IMPORT_FIELDS if name != "vin"]
+FORMATS = ("csv", "jsonl")
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportResult:
+    def __init__(self):
+        self.processed = 0
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line, errors):
+        self.failed += 1
+        # Полный список ошибок на миллионе строк не нужен — хватит первых
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, errors))
+
+    def __str__(self):
+        return (
+            f"строк: {self.processed}, создано: {self.created}, "
+            f"обновлено: {self.updated}, ошибок: {self.failed}"
+        )
+
+
+def detect_format(filename):
+    return "jsonl" if filename.lower().endswith((".jsonl", ".ndjson")) else "csv"
+
+
+def _text(stream):
+    # utf-8-sig — BOM, который добавляет Excel при сохранении в CSV
+    if isinstance(stream, io.TextIOBase):
+        return stream
+    return io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+
+def read_rows(stream, fmt):
+    """Строки файла как (номер строки, dict) — лениво, без чтения файла целиком."""
+    text = _text(stream)
+    if fmt == "jsonl":
+        for number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                yield number, exc
+                continue
+            if not isinstance(row, dict):
+                row = ValueError("Ожидается JSON-объект")
+            yield number, row
+        return
+
+    header = text.readline()
+    if not header:
+        return
+    try:
+        dialect = csv.Sniffer().sniff(header, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.DictReader(itertools.chain([header], text), dialect=dialect)
+    for row in reader:
+        yield reader.line_num, {key.strip(): value for key, value in row.items() if key}
+
+
+def _import_chunk(rows, result):
+    vins = {normalize_vin(row.get("vin")) for _, row in rows if isinstance(row, dict)}
+    existing = Car.objects.filter(vin__in=vins - {None}).in_bulk(field_name="vin")
+    cars = {}
+
+    for number, row in rows:
+        result.processed += 1
+        if isinstance(row, Exception):
+            result.add_error(number, {"__all__": [str(row)]})
+            continue
+        vin = normalize_vin(row.get("vin"))
+        current = cars.get(vin) or existing.get(vin)
+        # Форма меняет instance даже при ошибках — работаем с копией
+        instance = copy.copy(current) if current is not None else Car()
+        # Колонок может быть меньше, чем полей: остальное берём из текущей записи
+        data = {}
+        if current is not None:
+            data = model_to_dict(current, fields=IMPORT_FIELDS)
+        data.update({key: value for key, value in row.items() if key in IMPORT_FIELDS})
+        data["vin"] = vin
+        form = CarImportForm(data, instance=instance)
+        if not form.is_valid():
+            result.add_error(number, form.errors.get_json_data())
+            continue
+        cars[vin] = form.instance
+
+    created = [car for car in cars.values() if car.pk is None]
+    updated = [car for car in cars.values() if car.pk is not None]
+    with transaction.atomic():
+        Car.objects.bulk_create(created)
+        # Через базовый менеджер: CarQuerySet.update() прислал бы свой
+        # cars_updated с лишним SELECT, а прежнее состояние уже есть у машин
+        Car._base_manager.bulk_update(updated, UPDATE_FIELDS)
+        # bulk-операции не шлют post_save: индекс, кэш и рассылку обновят
+        # приёмники cars_updated
+        if cars:
+            cars_updated.send(
+                sender=Car,
+                car_ids=[car.pk for car in cars.values()],
+                fields=set(UPDATE_FIELDS),
+                # Состояние из БД до импорта — для оповещений об избранном
+                previous={car.pk: car._broadcast_state for car in updated},
+            )
+    result.created += len(created)
+    result.updated += len(updated)
+
+
+def import_cars(stream, fmt="csv", chunk_size=None, progress=None):
+    """Загружает машины из потока, обновляя существующие по VIN.
+
+    progress(result) вызывается после каждой пачки.
+    """
+    chunk_size = chunk_size or settings.INVENTORY_CHUNK_SIZE
+    result = ImportResult()
+    rows = read_rows(stream, fmt)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            break
+        _import_chunk(chunk, result)
+        if progress is not None:
+            progress(result)
+    return result
+
+
+# ==============================
+# Выгрузка
+# ==============================
+class _Echo:
+    # csv.writer пишет в «файл», который просто возвращает строку
+    def write(self, value):
+        return value
+
+
+def _serialize(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if value is None:
+        return ""
+    return str(value)
+
+
+def export_rows(queryset, fields, fmt="csv"):
+    """Генератор строк выгрузки; таблица читается курсором по кускам."""
+    rows = queryset.order_by("pk").values_list(*fields).iterator(
+        chunk_size=settings.INVENTORY_CHUNK_SIZE
+    )
+    if fmt == "jsonl":
+        for row in rows:
+            record = dict(zip(fields, map(_serialize, row)))
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+        return
+
+    writer = csv.writer(_Echo())
+    # BOM — чтобы Excel открыл кириллицу без вопросов о кодировке
+    yield "\ufeff" + writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([_serialize(value) for value in row])
+
+
+def streaming_export(queryset, fields, filename, fmt="csv"):
+    content_type = "application/x-ndjson" if fmt == "jsonl" else "text/csv"
+    response = StreamingHttpResponse(
+        export_rows(queryset, fields, fmt),
+        content_type=f"{content_type}; charset=utf-8",
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+
+CAR_EXPORT_FIELDS = ("id",) + tuple(IMPORT_FIELDS) + ("created_at",)
+ORDER_EXPORT_FIELDS = (
+    "id",
+    "user__username",
+    "user__email",
+    "car__vin",
+    "car__brand",
+    "car__model",
+    "car__price",
+    "status",
+    "comment",
+    "created_at",
+    "updated_at",
+)
@@ -0,0 +1,119 @@
+import asyncio
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import (
+    override_settings,
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from core.benchmark import SCENARIOS, Benchmark, environment_info, seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеры задержек (p50/p99) и пропускной способности HTTP-вьюх и "
+        "WebSocket-консьюмеров на отдельной тестовой БД"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "scenarios",
+            nargs="*",
+            help="Сценарии: %s (по умолчанию — все)" % ", ".join(SCENARIOS),
+        )
+        parser.add_argument("--cars", type=int, default=500, help="Машин в каталоге")
+        parser.add_argument("--users", type=int, default=50, help="Покупателей")
+        parser.add_argument(
+            "--requests", type=int, default=200, help="HTTP-запросов на сценарий"
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=10, help="Параллельных HTTP-запросов"
+        )
+        parser.add_argument(
+            "--connections", type=int, default=1000, help="WebSocket-подключений"
+        )
+        parser.add_argument(
+            "--rounds", type=int, default=20, help="Рассылок на WebSocket-сценарий"
+        )
+        parser.add_argument("--output", help="Файл для JSON с результатами")
+
+    def handle(self, *args, **options):
+        scenarios = options["scenarios"] or list(SCENARIOS)
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Неизвестные сценарии: {', '.join(sorted(unknown))}")
+
+        started_at = datetime.now(timezone.utc).isoformat()
+        # SQLite в памяти с общим кэшем не ждёт блокировок, а сразу падает
+        # с «table is locked» — для параллельной записи нужна файловая БД
+        workdir = tempfile.mkdtemp(prefix="autosalon-bench-")
+        for alias in connections:
+            settings_dict = connections[alias].settings_dict
+            if settings_dict["ENGINE"].endswith("sqlite3"):
+                settings_dict["TEST"]["NAME"] = os.path.join(workdir, f"{alias}.sqlite3")
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            # In-memory слой каналов и Telegram без сети: замеряем только приложение
+            with override_settings(
+                CHANNEL_LAYERS={
+                    "default": {
+                        "BACKEND": "core.channel_layers.ThreadSafeInMemoryChannelLayer",
+                        "CONFIG": {"capacity": 1000},
+                    }
+                },
+                TELEGRAM_TRANSPORT="fake",
+                TELEGRAM_CHAT_ID="benchmark",
+                ALLOWED_HOSTS=["testserver"],
+            ):
+                from autosalon.asgi import application
+
+                self.stdout.write("Заполнение БД...")
+                dataset = seed(options["cars"], options["users"])
+                benchmark = Benchmark(
+                    application,
+                    dataset,
+                    requests=options["requests"],
+                    concurrency=options["concurrency"],
+                    connections=options["connections"],
+                    rounds=options["rounds"],
+                )
+                results = asyncio.run(benchmark.run(scenarios))
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            "started_at": started_at,
+            "environment": environment_info(),
+            "dataset": {key: options[key] for key in ("cars", "users")},
+            "parameters": {
+                key: options[key]
+                for key in ("requests", "concurrency", "connections", "rounds")
+            },
+            "results": results,
+        }
+
+        for scenario, result in results.items():
+            self.stdout.write(
+                f"{scenario:>22}: p50={result.get('p50_ms')} мс "
+                f"p99={result.get('p99_ms')} мс "
+                f"{result.get('throughput_per_s')}/с ошибок={result.get('errors')}"
+            )
+
+        payload = json.dumps(report, ensure_ascii=False, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as output:
+                output.write(payload)
+            self.stdout.write(self.style.SUCCESS(f"Результаты: {options['output']}"))
+        else:
+            self.stdout.write(payload)
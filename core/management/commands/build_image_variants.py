@@ -0,0 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.cache import bump_cars, bump_catalog
+from core.images import IMAGE_FIELDS, generate_derivatives
+
+
+class Command(BaseCommand):
+    help = "Строит уменьшенные копии (WebP/JPEG) для уже загруженных изображений"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force", action="store_true", help="Перестроить и уже готовые варианты"
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=max(settings.IMAGE_WORKERS, 1),
+            help="Параллельных потоков",
+        )
+
+    def handle(self, *args, **options):
+        names = []
+        for label, field in IMAGE_FIELDS:
+            model = apps.get_model(label)
+            names += (
+                model.objects.exclude(**{field: ""})
+                .exclude(**{f"{field}__isnull": True})
+                .values_list(field, flat=True)
+            )
+        names = sorted(set(names))
+
+        # Pillow отпускает GIL при декодировании и сжатии — потоков достаточно
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            written = list(
+                executor.map(
+                    lambda name: generate_derivatives(name, force=options["force"]),
+                    names,
+                )
+            )
+
+        # Карточки с новыми вариантами должны перерендериться
+        car_ids = (
+            apps.get_model("core.Car")
+            .objects.exclude(photo="")
+            .exclude(photo__isnull=True)
+            .values_list("id", flat=True)
+        )
+        bump_cars(car_ids)
+        bump_catalog()
+
+        built = sum(1 for count in written if count)
+        self.stdout.write(
+            self.style.SUCCESS(f"Изображений: {len(names)}, обработано: {built}")
+        )
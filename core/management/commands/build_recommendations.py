@@ -0,0 +1,30 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.recommendations import build_similarities
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает похожие машины по просмотрам, избранному и характеристикам. "
+        "Запускать по расписанию (cron), например раз в час"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--top-k",
+            type=int,
+            default=settings.RECOMMENDATIONS_TOP_K,
+            help="Похожих машин на каждую",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rows = build_similarities(top_k=options["top_k"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Записано пар: {rows} за {time.monotonic() - started:.1f} с"
+            )
+        )
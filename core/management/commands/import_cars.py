@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.inventory import FORMATS, detect_format, import_cars
+
+
+class Command(BaseCommand):
+    help = "Импорт остатков из CSV/JSONL пачками с обновлением машин по VIN"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Файл CSV или JSONL")
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="Формат файла (по умолчанию — по расширению)",
+        )
+        parser.add_argument("--chunk-size", type=int, help="Строк в одной пачке")
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or detect_format(options["path"])
+        try:
+            stream = open(options["path"], "rb")
+        except OSError as exc:
+            raise CommandError(f"Не удалось открыть файл: {exc}")
+
+        with stream:
+            result = import_cars(
+                stream,
+                fmt,
+                chunk_size=options["chunk_size"],
+                progress=lambda result: self.stdout.write(str(result)),
+            )
+
+        for line, errors in result.errors:
+            self.stderr.write(f"Строка {line}: {errors}")
+        if result.failed > len(result.errors):
+            self.stderr.write(f"... и ещё {result.failed - len(result.errors)} ошибок")
+        self.stdout.write(self.style.SUCCESS(f"Готово: {result}"))
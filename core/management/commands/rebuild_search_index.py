@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.fulltext import INDEXES, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Перестраивает полнотекстовый индекс автомобилей и новостей"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "kinds",
+            nargs="*",
+            help="Какие индексы перестроить: %s (по умолчанию — все)"
+            % ", ".join(sorted(INDEXES)),
+        )
+
+    def handle(self, *args, **options):
+        unknown = set(options["kinds"]) - set(INDEXES)
+        if unknown:
+            raise CommandError(f"Неизвестные индексы: {', '.join(sorted(unknown))}")
+        for kind in options["kinds"] or sorted(INDEXES):
+            count = rebuild_index(kind)
+            self.stdout.write(self.style.SUCCESS(f"{kind}: проиндексировано {count}"))
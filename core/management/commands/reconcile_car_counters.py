@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает счётчики просмотров, избранного и заявок машин. "
+        "Запускать по расписанию (cron), например раз в сутки"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="Машин в одной пачке"
+        )
+
+    def handle(self, *args, **options):
+        fixed = reconcile(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Исправлено машин: {fixed}"))
@@ -0,0 +1,29 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from core.notifications import NotificationWorker
+
+
+class Command(BaseCommand):
+    help = "Запускает воркер очереди Telegram-уведомлений"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Один проход по очереди и выход (для cron)",
+        )
+
+    def handle(self, *args, **options):
+        worker = NotificationWorker()
+        if options["once"]:
+            processed = asyncio.run(worker.run_once())
+            self.stdout.write(self.style.SUCCESS(f"Обработано уведомлений: {processed}"))
+            return
+
+        self.stdout.write("Воркер уведомлений запущен. Ctrl+C — остановка.")
+        try:
+            asyncio.run(worker.run())
+        except KeyboardInterrupt:
+            self.stdout.write("Воркер остановлен.")
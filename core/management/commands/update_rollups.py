@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from core.analytics import rebuild_rollups, update_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Дополняет дневные итоги воронки данными с последней отметки. "
+        "Запускать по расписанию (cron), например раз в 5 минут"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help=(
+                "Удалить итоги и пересчитать всю историю заново "
+                "(кроме строк удалённых машин)"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        processed = (rebuild_rollups if options["rebuild"] else update_rollups)()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Просмотров: {processed['views']}, "
+                f"в избранное: {processed['favorites']}, "
+                f"дней заявок пересчитано: {processed['orders']}"
+            )
+        )
@@ -0,0 +1,423 @@
+# core/metrics.py
+"""Метрики запросов и WebSocket-консьюмеров в текстовом формате Prometheus.
+
+Значения хранятся в памяти процесса: при нескольких воркерах Daphne каждый
+отдаёт свои, суммирует их Prometheus.
+"""
+import bisect
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+
+
+# ==============================
+# Реестр
+# ==============================
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _format_labels(self, key, extra=()):
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ""
+        rendered = ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+        return "{" + rendered + "}"
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines += self._render_value(key, value)
+        return lines
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{self._format_labels(key)} {value}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=()):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            position = bisect.bisect_left(self.buckets, value)
+            if position < len(self.buckets):
+                state[0][position] += 1
+            state[1] += 1
+            state[2] += value
+
+    def _render_value(self, key, value):
+        counts, count, total = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            labels = self._format_labels(key, [("le", bound)])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = self._format_labels(key, [("le", "+Inf")])
+        lines.append(f"{self.name}_bucket{labels} {count}")
+        lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        lines.append(f"{self.name}_sum{self._format_labels(key)} {total}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, function):
+        """Функция, отдающая [(имя, тип, описание, значение)] на момент выгрузки."""
+        self.collectors.append(function)
+        return function
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        for collect in self.collectors:
+            try:
+                samples = collect()
+            except Exception:
+                logger.exception("Ошибка сборщика метрик %s", collect.__name__)
+                continue
+            for name, kind, documentation, value in samples:
+                lines += [
+                    f"# HELP {name} {documentation}",
+                    f"# TYPE {name} {kind}",
+                    f"{name} {value}",
+                ]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (1_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500, 1000)
+
+http_requests = registry.add(
+    Counter("http_requests_total", "HTTP-запросы", ("view", "method", "status"))
+)
+http_duration = registry.add(
+    Histogram(
+        "http_request_duration_seconds", "Время ответа", ("view",), DURATION_BUCKETS
+    )
+)
+http_queries = registry.add(
+    Histogram(
+        "http_db_queries", "SQL-запросов на HTTP-запрос", ("view",), QUERY_BUCKETS
+    )
+)
+http_db_time = registry.add(
+    Histogram(
+        "http_db_seconds", "Время в БД на HTTP-запрос", ("view",), DURATION_BUCKETS
+    )
+)
+http_template_time = registry.add(
+    Histogram(
+        "http_template_seconds",
+        "Рендеринг шаблонов на HTTP-запрос",
+        ("view",),
+        DURATION_BUCKETS,
+    )
+)
+http_response_size = registry.add(
+    Histogram("http_response_bytes", "Размер ответа", ("view",), SIZE_BUCKETS)
+)
+over_budget = registry.add(
+    Counter(
+        "http_query_budget_exceeded_total", "Запросы сверх бюджета SQL", ("view",)
+    )
+)
+ws_connections = registry.add(
+    Gauge("ws_connections", "Открытые WebSocket-соединения", ("consumer",))
+)
+ws_messages = registry.add(
+    Counter("ws_messages_total", "Сообщения консьюмеров", ("consumer", "type"))
+)
+ws_duration = registry.add(
+    Histogram(
+        "ws_handler_duration_seconds",
+        "Время обработки сообщения консьюмером",
+        ("consumer", "type"),
+        DURATION_BUCKETS,
+    )
+)
+ws_queries = registry.add(
+    Histogram(
+        "ws_db_queries",
+        "SQL-запросов на сообщение консьюмера",
+        ("consumer",),
+        QUERY_BUCKETS,
+    )
+)
+channel_batch_size = registry.add(
+    Histogram(
+        "channel_layer_batch_size",
+        "group_send в одной пачке слоя каналов",
+        ("layer",),
+        COUNT_BUCKETS,
+    )
+)
+channel_group_size = registry.add(
+    Histogram(
+        "channel_layer_group_size",
+        "Каналов в группе при group_send",
+        ("layer",),
+        COUNT_BUCKETS,
+    )
+)
+channel_send_duration = registry.add(
+    Histogram(
+        "channel_layer_send_seconds",
+        "Время отправки пачки group_send",
+        ("layer",),
+        DURATION_BUCKETS,
+    )
+)
+
+
+# ==============================
+# Счётчики текущего запроса
+# ==============================
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+
+
+_current = ContextVar("request_stats", default=None)
+
+
+def current_stats():
+    return _current.get()
+
+
+def start_stats():
+    # Соединения этого потока, открытые до импорта модуля, сигнал не застал
+    for connection in connections.all():
+        _install(connection)
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def stop_stats(token):
+    _current.reset(token)
+
+
+def _count_queries(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - started
+
+
+def _install(connection):
+    if _count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_queries)
+
+
+def install_query_counter(sender, connection, **kwargs):
+    # Обёртка живёт вместе с соединением — ставим при его создании
+    _install(connection)
+
+
+connection_created.connect(install_query_counter)
+
+
+# ==============================
+# Шаблоны: время рендеринга без двойного счёта вложенных
+# ==============================
+class InstrumentedTemplate(Template):
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return super().render(context, request)
+        stats.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_depth -= 1
+            if not stats.template_depth:
+                stats.template_time += time.perf_counter() - started
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return InstrumentedTemplate(template.template, self)
+
+
+# ==============================
+# HTTP
+# ==============================
+def view_label(request):
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match is not None else "<unresolved>"
+
+
+def query_budget(view):
+    return settings.QUERY_BUDGETS.get(view, settings.QUERY_BUDGET_DEFAULT)
+
+
+class MetricsMiddleware:
+    """Число SQL-запросов, время в БД и шаблонах, размер ответа — по имени URL.
+
+    Запросы сверх бюджета (QUERY_BUDGETS) пишутся в лог с предупреждением.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats, token = start_stats()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            stop_stats(token)
+        duration = time.perf_counter() - started
+
+        view = view_label(request)
+        http_requests.inc(view=view, method=request.method, status=response.status_code)
+        http_duration.observe(duration, view=view)
+        http_queries.observe(stats.queries, view=view)
+        http_db_time.observe(stats.db_time, view=view)
+        http_template_time.observe(stats.template_time, view=view)
+        if not response.streaming:
+            http_response_size.observe(len(response.content), view=view)
+
+        budget = query_budget(view)
+        if budget is not None and stats.queries > budget:
+            over_budget.inc(view=view)
+            logger.warning(
+                "%s %s: %s SQL-запросов при бюджете %s (%.1f мс в БД)",
+                request.method,
+                request.path,
+                stats.queries,
+                budget,
+                stats.db_time * 1000,
+            )
+        return response
+
+
+# ==============================
+# Channels
+# ==============================
+class ConsumerMetricsMixin:
+    """Метрики для AsyncWebsocketConsumer: соединения, сообщения, SQL."""
+
+    async def dispatch(self, message):
+        consumer = type(self).__name__
+        message_type = message["type"]
+        if message_type == "websocket.connect":
+            ws_connections.inc(consumer=consumer)
+        elif message_type == "websocket.disconnect":
+            ws_connections.inc(-1, consumer=consumer)
+
+        stats, token = start_stats()
+        started = time.perf_counter()
+        try:
+            await super().dispatch(message)
+        finally:
+            stop_stats(token)
+            ws_messages.inc(consumer=consumer, type=message_type)
+            ws_duration.observe(
+                time.perf_counter() - started, consumer=consumer, type=message_type
+            )
+            ws_queries.observe(stats.queries, consumer=consumer)
+
+
+# ==============================
+# Сторонние счётчики: буфер чата, кэш
+# ==============================
+@registry.collector
+def chat_buffer_metrics():
+    from .chat_store import chat_write_buffer
+
+    return [
+        (f"chat_write_buffer_{name}", "gauge", f"Буфер записи чата: {name}", value)
+        for name, value in chat_write_buffer.metrics().items()
+    ]
+
+
+@registry.collector
+def cache_metrics():
+    from .cache import stats
+
+    return [
+        (f"cache_{name}", "gauge", f"Кэш каталога: {name}", value)
+        for name, value in stats.snapshot().items()
+        if value is not None
+    ]
+
+
+def render():
+    return registry.render()
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='car_status_created_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.db import migrations
+
+# Таблицы полнотекстового индекса (см. core/fulltext.py).
+# Таблица -> (исходная таблица, выражение заголовка, выражение текста)
+TABLES = {
+    "core_search_car": ("core_car", "brand || ' ' || model", "description"),
+    "core_search_news": ("core_news", "title", "content"),
+}
+
+
+def create_search_tables(apps, schema_editor):
+    connection = schema_editor.connection
+    for table, (source, title, body) in TABLES.items():
+        if connection.vendor == "sqlite":
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE {table} USING fts5("
+                "title, body, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+            schema_editor.execute(
+                f"INSERT INTO {table} (rowid, title, body)"
+                f" SELECT id, {title}, {body} FROM {source}"
+            )
+        elif connection.vendor == "postgresql":
+            schema_editor.execute(
+                f"CREATE TABLE {table} ("
+                "object_id bigint PRIMARY KEY, document tsvector NOT NULL)"
+            )
+            schema_editor.execute(
+                f"CREATE INDEX {table}_document_idx ON {table} USING GIN (document)"
+            )
+            # Та же конфигурация, что в запросах core/fulltext.py
+            schema_editor.execute(
+                f"INSERT INTO {table} (object_id, document)"
+                f" SELECT id, setweight(to_tsvector(%s, {title}), 'A')"
+                f" || setweight(to_tsvector(%s, {body}), 'B') FROM {source}",
+                [settings.SEARCH_CONFIG, settings.SEARCH_CONFIG],
+            )
+
+
+def drop_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor in ("sqlite", "postgresql"):
+        for table in TABLES:
+            schema_editor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_car_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_tables, drop_search_tables),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 09:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_chat_room_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='vin',
+            field=models.CharField(blank=True, max_length=17, null=True, unique=True, verbose_name='VIN'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:02
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# Поле счётчика -> модель, строки которой он считает
+COUNTERS = {
+    "views_count": "ViewHistory",
+    "favorites_count": "Favorite",
+    "orders_count": "Order",
+}
+
+
+def fill_counters(apps, schema_editor):
+    # Один UPDATE с подзапросами вместо цикла по машинам
+    Car = apps.get_model("core", "Car")
+    values = {}
+    for field, model_name in COUNTERS.items():
+        model = apps.get_model("core", model_name)
+        counts = (
+            model.objects.filter(car=OuterRef("pk"))
+            .order_by()
+            .values("car")
+            .annotate(count=Count("id"))
+            .values("count")
+        )
+        values[field] = Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+    Car.objects.update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_car_vin'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='orders_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Заявок'),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='views_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Просмотров'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['status', '-views_count', '-id'], name='car_status_popular_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_car_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CarSimilarity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Сходство')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Место')),
+                ('car', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.car', verbose_name='Автомобиль')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_to', to='core.car', verbose_name='Похожий автомобиль')),
+            ],
+            options={
+                'verbose_name': 'Похожий автомобиль',
+                'verbose_name_plural': 'Похожие автомобили',
+                'constraints': [models.UniqueConstraint(fields=('car', 'rank'), name='car_similarity_rank_uniq')],
+            },
+        ),
+    ]
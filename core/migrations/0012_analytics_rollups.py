@@ -0,0 +1,68 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_carsimilarity'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCarStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('brand', models.CharField(max_length=100, verbose_name='Марка')),
+                ('views', models.PositiveIntegerField(default=0, verbose_name='Просмотры')),
+                ('favorites', models.PositiveIntegerField(default=0, verbose_name='В избранное')),
+                ('orders', models.PositiveIntegerField(default=0, verbose_name='Заявки')),
+                ('completed', models.PositiveIntegerField(default=0, verbose_name='Завершённые')),
+            ],
+            options={
+                'verbose_name': 'Дневная статистика',
+                'verbose_name_plural': 'Дневная статистика',
+                'ordering': ['-date', 'brand'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Источник')),
+                ('last_id', models.PositiveBigIntegerField(default=0, verbose_name='Последний id')),
+                ('last_time', models.DateTimeField(blank=True, null=True, verbose_name='Обработано до')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Отметка роллапов',
+                'verbose_name_plural': 'Отметки роллапов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['updated_at'], name='order_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at'], name='order_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailycarstats',
+            name='car',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.car', verbose_name='Автомобиль'),
+        ),
+        migrations.AddIndex(
+            model_name='dailycarstats',
+            index=models.Index(fields=['date', 'brand'], name='daily_stats_brand_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycarstats',
+            constraint=models.UniqueConstraint(fields=('date', 'car'), name='daily_car_stats_uniq'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:09
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_analytics_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(choices=[('new', 'Новая'), ('in_progress', 'В работе'), ('completed', 'Завершена'), ('cancelled', 'Отменена')], max_length=20, verbose_name='Был статус')),
+                ('to_status', models.CharField(choices=[('new', 'Новая'), ('in_progress', 'В работе'), ('completed', 'Завершена'), ('cancelled', 'Отменена')], max_length=20, verbose_name='Стал статус')),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Когда')),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Кто изменил')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_changes', to='core.order', verbose_name='Заявка')),
+            ],
+            options={
+                'verbose_name': 'Смена статуса заявки',
+                'verbose_name_plural': 'История статусов заявок',
+                'ordering': ['-changed_at'],
+                'indexes': [models.Index(fields=['order', '-changed_at'], name='order_status_change_idx')],
+            },
+        ),
+    ]
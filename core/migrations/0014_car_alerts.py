@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-18 10:14
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_orderstatuschange'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CarAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('price_drop', 'Снижение цены'), ('back_in_stock', 'Снова в наличии')], max_length=20, verbose_name='Тип')),
+                ('value', models.CharField(max_length=32, verbose_name='Значение')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Отправлено')),
+                ('car', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.car', verbose_name='Автомобиль')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='car_alerts', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Оповещение об избранном',
+                'verbose_name_plural': 'Оповещения об избранном',
+                'ordering': ['-created_at'],
+                'constraints': [models.UniqueConstraint(fields=('car', 'kind', 'value', 'user'), name='car_alert_uniq')],
+            },
+        ),
+    ]
@@ -1,7 +1,32 @@
 # core/models.py
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.dispatch import Signal
+
+# Поля машины, изменения которых рассылаются клиентам в реальном времени
+BROADCAST_FIELDS = ("price", "status")
+
+# Массовое изменение машин через QuerySet.update(): аргументы car_ids и fields,
+# previous — {car_id: (цена, статус) до изменения}, если менялись BROADCAST_FIELDS
+cars_updated = Signal()
+
+# Удаление строк ViewHistory, Favorite и Order напрямую, не каскадом:
+# car_ids и user_ids удалённых строк (с повторами) — для счётчиков и сводок
+car_activity_deleted = Signal()
+
+# Денормализованные счётчики машины: их меняет только core/counters.py
+COUNTER_FIELDS = frozenset({"views_count", "favorites_count", "orders_count"})
+
+# Поля, которых нет ни в карточках и страницах каталога, ни в рассылке и
+# оповещениях: их массовое изменение обходится без SELECT и cars_updated
+QUIET_FIELDS = frozenset({"vin", *COUNTER_FIELDS})
+
+
+def normalize_vin(value):
+    """VIN без пробелов по краям, заглавными; пустой — None (поле уникальное)."""
+    return str(value or "").strip().upper() or None
 
 
 class UserProfile(models.Model):
@@ -22,12 +47,45 @@ class UserProfile(models.Model):
         return f"{self.user.username} - Профиль"
 
 
+class CarQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        if QUIET_FIELDS.issuperset(kwargs):
+            return super().update(**kwargs)
+        # update() не вызывает post_save — сообщаем об изменённых машинах сами
+        previous = {}
+        with transaction.atomic(using=self.db):
+            if set(kwargs).intersection(BROADCAST_FIELDS):
+                # Прежние цену и статус берём тем же SELECT — для оповещений
+                previous = {
+                    car_id: tuple(state)
+                    for car_id, *state in self.values_list("id", *BROADCAST_FIELDS)
+                }
+                car_ids = list(previous)
+            else:
+                car_ids = list(self.values_list("id", flat=True))
+            rows = super().update(**kwargs)
+        if car_ids:
+            cars_updated.send(
+                sender=Car, car_ids=car_ids, fields=set(kwargs), previous=previous
+            )
+        return rows
+
+    def update_counters(self, **values):
+        # Счётчики популярности не влияют ни на карточки, ни на рассылку цен:
+        # обновляем без лишнего SELECT и без сигнала cars_updated
+        return super().update(**values)
+
+
 class Car(models.Model):
     STATUS_CHOICES = [
         ("available", "В наличии"),
         ("sold", "Продано"),
     ]
 
+    # Естественный ключ для импорта остатков от поставщиков
+    vin = models.CharField(
+        max_length=17, unique=True, null=True, blank=True, verbose_name="VIN"
+    )
     brand = models.CharField(max_length=100, verbose_name="Марка")
     model = models.CharField(max_length=100, verbose_name="Модель")
     year = models.PositiveIntegerField(verbose_name="Год выпуска")
@@ -46,16 +104,117 @@ class Car(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата добавления")
 
+    # Денормализованные счётчики (core/counters.py): популярность без COUNT
+    views_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Просмотров"
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="В избранном"
+    )
+    orders_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Заявок"
+    )
+
+    objects = CarQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Автомобиль"
         verbose_name_plural = "Автомобили"
         ordering = ["-created_at"]
+        indexes = [
+            # Каталог: WHERE status = ... ORDER BY created_at DESC, id DESC
+            models.Index(
+                fields=["status", "-created_at", "-id"], name="car_status_created_idx"
+            ),
+            # Фильтры и фасеты публичного поиска
+            models.Index(fields=["status", "brand", "model"], name="car_status_brand_idx"),
+            models.Index(fields=["status", "price"], name="car_status_price_idx"),
+            models.Index(fields=["status", "year"], name="car_status_year_idx"),
+            models.Index(fields=["status", "mileage"], name="car_status_mileage_idx"),
+            models.Index(fields=["status", "color"], name="car_status_color_idx"),
+            # Сортировка каталога «Популярные»
+            models.Index(
+                fields=["status", "-views_count", "-id"], name="car_status_popular_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.brand} {self.model} ({self.year})"
 
+    def clean(self):
+        super().clean()
+        # До проверки уникальности: «abc» и «ABC» — один VIN
+        self.vin = normalize_vin(self.vin)
+
+    def save(self, *args, **kwargs):
+        # VIN — ключ импорта остатков (core/inventory.py): храним в том же виде,
+        # в каком его ищет импорт, как бы его ни ввели (отложенное поле не трогаем)
+        if "vin" in self.__dict__:
+            self.vin = normalize_vin(self.vin)
+        # Счётчики не пишем: экземпляр мог устареть (админка, list_editable),
+        # а счётчики тем временем увеличили атомарные UPDATE
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            deferred = self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in COUNTER_FIELDS
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем загруженные цену и статус, чтобы рассылать только их изменения
+        instance._broadcast_state = instance.broadcast_state()
+        return instance
+
+    def broadcast_state(self):
+        return tuple(self.__dict__.get(field) for field in BROADCAST_FIELDS)
+
+    def broadcast_changed(self):
+        return getattr(self, "_broadcast_state", None) != self.broadcast_state()
+
+
+class CarActivityQuerySet(models.QuerySet):
+    def delete(self):
+        # Сигнал, а не post_delete: приёмник post_delete отключил бы быстрое
+        # удаление этих строк каскадом от User и Car
+        rows = list(self.values_list("car_id", "user_id"))
+        result = super().delete()
+        if rows:
+            car_ids, user_ids = zip(*rows)
+            car_activity_deleted.send(
+                sender=self.model, car_ids=list(car_ids), user_ids=list(user_ids)
+            )
+        return result
+
+
+class CarActivity(models.Model):
+    """Строка активности пользователя по машине, учтённая в счётчиках Car.
+
+    Прямое удаление шлёт car_activity_deleted; удаление каскадом от
+    пользователя учитывает pre_delete User (core/signals.py), от машины —
+    не нужно: счётчики уходят вместе с ней.
+    """
+
+    objects = CarActivityQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def delete(self, *args, **kwargs):
+        car_id, user_id = self.car_id, self.user_id
+        result = super().delete(*args, **kwargs)
+        car_activity_deleted.send(
+            sender=type(self), car_ids=[car_id], user_ids=[user_id]
+        )
+        return result
 
-class ViewHistory(models.Model):
+
+class ViewHistory(CarActivity):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -72,12 +231,16 @@ class ViewHistory(models.Model):
         verbose_name_plural = "Истории просмотров"
         unique_together = ("user", "car")  # Один пользователь — одна запись на машину
         ordering = ["-viewed_at"]
+        indexes = [
+            # Последние просмотры в профиле без сортировки всей истории
+            models.Index(fields=["user", "-viewed_at"], name="view_history_user_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user.username} → {self.car}"
 
 
-class Favorite(models.Model):
+class Favorite(CarActivity):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -96,6 +259,10 @@ class Favorite(models.Model):
         verbose_name = "Избранное"
         verbose_name_plural = "Избранные"
         unique_together = ("user", "car")
+        indexes = [
+            # Страницы избранного в профиле (core/profile.py)
+            models.Index(fields=["user", "-id"], name="favorite_user_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user.username} ♥ {self.car}"
@@ -104,7 +271,7 @@ class Favorite(models.Model):
 # core/models.py
 
 
-class Order(models.Model):
+class Order(CarActivity):
     STATUS_CHOICES = [
         ("new", "Новая"),
         ("in_progress", "В работе"),
@@ -132,10 +299,100 @@ class Order(models.Model):
         verbose_name = "Заявка"
         verbose_name_plural = "Заявки"
         ordering = ["-created_at"]
+        indexes = [
+            # Роллапы аналитики: изменённые после отметки и заявки за день
+            models.Index(fields=["updated_at"], name="order_updated_idx"),
+            models.Index(fields=["created_at"], name="order_created_idx"),
+            # Страницы заявок в профиле (core/profile.py)
+            models.Index(fields=["user", "-id"], name="order_user_idx"),
+        ]
 
     def __str__(self):
         return f"Заявка #{self.id} от {self.user.username} на {self.car}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Загруженный статус — чтобы записать в историю его смену при save()
+        instance._loaded_status = instance.__dict__.get("status")
+        return instance
+
+
+class OrderStatusChange(models.Model):
+    """История статусов заявок (core/orders.py)."""
+
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name="status_changes",
+        verbose_name="Заявка",
+    )
+    from_status = models.CharField(
+        max_length=20, choices=Order.STATUS_CHOICES, verbose_name="Был статус"
+    )
+    to_status = models.CharField(
+        max_length=20, choices=Order.STATUS_CHOICES, verbose_name="Стал статус"
+    )
+    changed_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="Кто изменил",
+    )
+    changed_at = models.DateTimeField(default=timezone.now, verbose_name="Когда")
+
+    class Meta:
+        verbose_name = "Смена статуса заявки"
+        verbose_name_plural = "История статусов заявок"
+        ordering = ["-changed_at"]
+        indexes = [
+            models.Index(
+                fields=["order", "-changed_at"], name="order_status_change_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"#{self.order_id}: {self.from_status} → {self.to_status}"
+
+
+class CarAlert(models.Model):
+    """Отправленные оповещения об избранном — защита от повторов (core/alerts.py)."""
+
+    KIND_CHOICES = [
+        ("price_drop", "Снижение цены"),
+        ("back_in_stock", "Снова в наличии"),
+    ]
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="car_alerts",
+        verbose_name="Пользователь",
+    )
+    car = models.ForeignKey(
+        Car, on_delete=models.CASCADE, related_name="+", verbose_name="Автомобиль"
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name="Тип")
+    # Ключ повтора: новая цена для снижения, дата для возврата в наличие
+    value = models.CharField(max_length=32, verbose_name="Значение")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Отправлено")
+
+    class Meta:
+        verbose_name = "Оповещение об избранном"
+        verbose_name_plural = "Оповещения об избранном"
+        ordering = ["-created_at"]
+        constraints = [
+            # Машина первой — проверка повторов идёт по car_id__in
+            models.UniqueConstraint(
+                fields=["car", "kind", "value", "user"], name="car_alert_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} · {self.car_id}: {self.get_kind_display()}"
+
 
 class News(models.Model):
     title = models.CharField(max_length=200, verbose_name="Заголовок")
@@ -170,15 +427,156 @@ class ChatMessage(models.Model):
         related_name="received_messages",
         verbose_name="Администратор",
     )
+    car = models.ForeignKey(
+        Car,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="chat_messages",
+        verbose_name="Автомобиль",
+    )
     message = models.TextField(verbose_name="Сообщение")
     is_read = models.BooleanField(default=False, verbose_name="Прочитано")
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата отправки")
+    # Не auto_now_add: при отложенной записи время ставится в момент рассылки
+    created_at = models.DateTimeField(
+        default=timezone.now, editable=False, verbose_name="Дата отправки"
+    )
 
     class Meta:
         verbose_name = "Сообщение чата"
         verbose_name_plural = "Сообщения чата"
         ordering = ["created_at"]
+        indexes = [
+            # История комнаты: WHERE car_id = ... ORDER BY created_at DESC, id DESC
+            models.Index(
+                fields=["car", "-created_at", "-id"], name="chat_room_created_idx"
+            ),
+        ]
 
     def __str__(self):
         to = self.admin.username if self.admin else "Админ"
         return f"{self.user.username} → {to}: {self.message[:50]}..."
+
+
+class OutboundNotification(models.Model):
+    STATUS_CHOICES = [
+        ("pending", "В очереди"),
+        ("sending", "Отправляется"),
+        ("sent", "Отправлено"),
+        ("failed", "Ошибка"),
+    ]
+
+    chat_id = models.CharField(max_length=100, verbose_name="Telegram Chat ID")
+    text = models.TextField(verbose_name="Текст")
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default="pending", verbose_name="Статус"
+    )
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Попыток")
+    next_attempt_at = models.DateTimeField(
+        default=timezone.now, verbose_name="Следующая попытка"
+    )
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    # Когда воркер взял запись в отправку: по нему release_stale отличает
+    # зависшие записи от тех, что прямо сейчас отправляет другой воркер
+    claimed_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="Взято в отправку"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата отправки")
+
+    class Meta:
+        verbose_name = "Исходящее уведомление"
+        verbose_name_plural = "Исходящие уведомления"
+        ordering = ["created_at"]
+        indexes = [
+            # Выборка воркера: WHERE status = 'pending' AND next_attempt_at <= now
+            models.Index(
+                fields=["status", "next_attempt_at"], name="notification_queue_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} → {self.chat_id} ({self.get_status_display()})"
+
+
+class CarSimilarity(models.Model):
+    """Top-K похожих машин, рассчитанных командой build_recommendations."""
+
+    car = models.ForeignKey(
+        Car, on_delete=models.CASCADE, related_name="+", verbose_name="Автомобиль"
+    )
+    similar = models.ForeignKey(
+        Car,
+        on_delete=models.CASCADE,
+        related_name="similar_to",
+        verbose_name="Похожий автомобиль",
+    )
+    score = models.FloatField(verbose_name="Сходство")
+    rank = models.PositiveSmallIntegerField(verbose_name="Место")
+
+    class Meta:
+        verbose_name = "Похожий автомобиль"
+        verbose_name_plural = "Похожие автомобили"
+        constraints = [
+            # «Похожие на машину» — WHERE car_id = ... ORDER BY rank по этому индексу
+            models.UniqueConstraint(
+                fields=["car", "rank"], name="car_similarity_rank_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.car_id} ~ {self.similar_id} ({self.score:.3f})"
+
+
+class DailyCarStats(models.Model):
+    """Дневные итоги воронки по машине; заполняет core/analytics.py."""
+
+    date = models.DateField(verbose_name="Дата")
+    # Удаление машины не стирает продажи из отчётов по маркам
+    car = models.ForeignKey(
+        Car,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="+",
+        verbose_name="Автомобиль",
+    )
+    # Марка копируется, чтобы отчёт по маркам не соединял таблицы
+    brand = models.CharField(max_length=100, verbose_name="Марка")
+    views = models.PositiveIntegerField(default=0, verbose_name="Просмотры")
+    favorites = models.PositiveIntegerField(default=0, verbose_name="В избранное")
+    orders = models.PositiveIntegerField(default=0, verbose_name="Заявки")
+    completed = models.PositiveIntegerField(default=0, verbose_name="Завершённые")
+
+    class Meta:
+        verbose_name = "Дневная статистика"
+        verbose_name_plural = "Дневная статистика"
+        ordering = ["-date", "brand"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "car"], name="daily_car_stats_uniq"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["date", "brand"], name="daily_stats_brand_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.brand} #{self.car_id}"
+
+
+class RollupWatermark(models.Model):
+    """Докуда обработан источник роллапов: последний id или момент времени."""
+
+    name = models.CharField(max_length=50, unique=True, verbose_name="Источник")
+    last_id = models.PositiveBigIntegerField(default=0, verbose_name="Последний id")
+    last_time = models.DateTimeField(
+        null=True, blank=True, verbose_name="Обработано до"
+    )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    class Meta:
+        verbose_name = "Отметка роллапов"
+        verbose_name_plural = "Отметки роллапов"
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,217 @@
+# core/notifications.py
+import asyncio
+import logging
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import OutboundNotification
+from .telegram import RateLimited, get_transport
+
+logger = logging.getLogger(__name__)
+
+# Лимит длины одного сообщения Telegram (с запасом под заголовок сводки)
+MAX_MESSAGE_LENGTH = 4000
+DIGEST_SEPARATOR = "\n\n— — —\n\n"
+
+
+def enqueue(text, chat_id=None):
+    """Ставит уведомление в очередь. Отправит его воркер, а не текущий запрос."""
+    chat_id = chat_id or settings.TELEGRAM_CHAT_ID
+    if not chat_id:
+        logger.warning("TELEGRAM_CHAT_ID не задан, уведомление пропущено")
+        return None
+    return OutboundNotification.objects.create(chat_id=chat_id, text=text)
+
+
+def enqueue_many(items):
+    """Пачка уведомлений одним INSERT: items — пары (chat_id, text)."""
+    return OutboundNotification.objects.bulk_create(
+        [
+            OutboundNotification(chat_id=chat_id or settings.TELEGRAM_CHAT_ID, text=text)
+            for chat_id, text in items
+            if chat_id or settings.TELEGRAM_CHAT_ID
+        ]
+    )
+
+
+def build_digests(texts):
+    """Склеивает всплеск сообщений для одного чата в минимум сообщений-сводок.
+
+    Возвращает список (текст, число исходных сообщений в нём).
+    """
+    if len(texts) == 1:
+        return [(texts[0], 1)]
+
+    digests = []
+    chunk = []
+    length = 0
+    for text in texts:
+        if chunk and length + len(DIGEST_SEPARATOR) + len(text) > MAX_MESSAGE_LENGTH:
+            digests.append(chunk)
+            chunk, length = [], 0
+        chunk.append(text)
+        length += len(text) + len(DIGEST_SEPARATOR)
+    digests.append(chunk)
+
+    return [
+        (
+            f"📬 *Сводка: {len(chunk)} уведомл.*{DIGEST_SEPARATOR}"
+            + DIGEST_SEPARATOR.join(chunk)
+            if len(chunk) > 1
+            else chunk[0],
+            len(chunk),
+        )
+        for chunk in digests
+    ]
+
+
+def retry_delay(attempts):
+    # Экспоненциальная задержка: base, 2*base, 4*base ... не больше часа
+    return min(settings.NOTIFICATION_RETRY_BASE_DELAY * 2 ** (attempts - 1), 3600)
+
+
+class NotificationWorker:
+    """Долгоживущий воркер: вычитывает очередь и отправляет через один транспорт."""
+
+    def __init__(self, transport=None, batch_size=None, poll_interval=None):
+        self.transport = transport or get_transport()
+        self.batch_size = batch_size or settings.NOTIFICATION_BATCH_SIZE
+        self.poll_interval = poll_interval or settings.NOTIFICATION_POLL_INTERVAL
+        self.max_attempts = settings.NOTIFICATION_MAX_ATTEMPTS
+        self.chat_interval = settings.TELEGRAM_CHAT_INTERVAL
+        self._last_sent = {}
+        self._paused_until = 0.0
+
+    async def run(self, stop_event=None):
+        stop_event = stop_event or asyncio.Event()
+        await sync_to_async(self.release_stale)()
+        await self.transport.start()
+        try:
+            while not stop_event.is_set():
+                processed = await self.drain_once()
+                if not processed:
+                    try:
+                        await asyncio.wait_for(stop_event.wait(), self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            await self.transport.close()
+
+    async def run_once(self):
+        """Проход по очереди до пустой выборки (для cron): число обработанных."""
+        await sync_to_async(self.release_stale)()
+        await self.transport.start()
+        try:
+            total = 0
+            while processed := await self.drain_once():
+                total += processed
+            return total
+        finally:
+            await self.transport.close()
+
+    async def drain_once(self):
+        batch = await sync_to_async(self.claim)()
+        if not batch:
+            return 0
+
+        by_chat = {}
+        for notification in batch:
+            by_chat.setdefault(notification.chat_id, []).append(notification)
+
+        for chat_id, notifications in by_chat.items():
+            await self._send_chat(chat_id, notifications)
+        return len(batch)
+
+    async def _send_chat(self, chat_id, notifications):
+        offset = 0
+        for text, count in build_digests([n.text for n in notifications]):
+            group = notifications[offset : offset + count]
+            offset += count
+            await self._wait_rate_limit(chat_id)
+            try:
+                await self.transport.send(chat_id, text)
+            except RateLimited as exc:
+                # Лимит Telegram: не считаем попытку, откладываем всё до конца паузы
+                self._paused_until = time.monotonic() + exc.retry_after
+                logger.warning("Telegram просит паузу %s с", exc.retry_after)
+                await sync_to_async(self.postpone)(
+                    notifications[offset - count :], exc.retry_after
+                )
+                return
+            except Exception as exc:
+                logger.exception("Не удалось отправить уведомление в %s", chat_id)
+                await sync_to_async(self.mark_failed)(group, exc)
+            else:
+                await sync_to_async(self.mark_sent)(group)
+            finally:
+                self._last_sent[chat_id] = time.monotonic()
+
+    async def _wait_rate_limit(self, chat_id):
+        # Глобальная пауза после RetryAfter и минимальный интервал на чат
+        now = time.monotonic()
+        wait = max(
+            self._paused_until - now,
+            self._last_sent.get(chat_id, 0.0) + self.chat_interval - now,
+            0.0,
+        )
+        if wait:
+            await asyncio.sleep(wait)
+
+    def release_stale(self):
+        # Возвращаем в очередь то, что зависло в «sending» после падения воркера.
+        # Только с истёкшей арендой: свежие записи отправляет другой воркер
+        cutoff = timezone.now() - timedelta(seconds=settings.NOTIFICATION_LEASE)
+        return (
+            OutboundNotification.objects.filter(status="sending")
+            .filter(Q(claimed_at__lt=cutoff) | Q(claimed_at__isnull=True))
+            .update(status="pending", claimed_at=None)
+        )
+
+    def claim(self):
+        with transaction.atomic():
+            ids = list(
+                # skip_locked: параллельные воркеры берут разные записи, а не
+                # ждут друг друга на одних и тех же
+                OutboundNotification.objects.select_for_update(skip_locked=True)
+                .filter(status="pending", next_attempt_at__lte=timezone.now())
+                .order_by("created_at", "id")
+                .values_list("id", flat=True)[: self.batch_size]
+            )
+            if not ids:
+                return []
+            OutboundNotification.objects.filter(id__in=ids).update(
+                status="sending", claimed_at=timezone.now()
+            )
+        return list(OutboundNotification.objects.filter(id__in=ids).order_by("id"))
+
+    def mark_sent(self, notifications):
+        OutboundNotification.objects.filter(id__in=[n.id for n in notifications]).update(
+            status="sent", sent_at=timezone.now(), last_error=""
+        )
+
+    def postpone(self, notifications, seconds):
+        OutboundNotification.objects.filter(id__in=[n.id for n in notifications]).update(
+            status="pending", next_attempt_at=timezone.now() + timedelta(seconds=seconds)
+        )
+
+    def mark_failed(self, notifications, error):
+        now = timezone.now()
+        for notification in notifications:
+            notification.attempts += 1
+            notification.last_error = repr(error)
+            if notification.attempts >= self.max_attempts:
+                notification.status = "failed"
+            else:
+                notification.status = "pending"
+                notification.next_attempt_at = now + timedelta(
+                    seconds=retry_delay(notification.attempts)
+                )
+        OutboundNotification.objects.bulk_update(
+            notifications, ["attempts", "last_error", "status", "next_attempt_at"]
+        )
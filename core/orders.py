@@ -0,0 +1,168 @@
+# core/orders.py
+"""Смена статусов заявок: проверка переходов, история и уведомления.
+
+Массовая смена из админки — постоянное число запросов при любом числе
+заявок: один SELECT, один UPDATE, один INSERT истории и один INSERT
+уведомлений в Telegram, плюс одно событие в WebSocket менеджерам на всё
+действие и личные события покупателям, у которых открыт сайт.
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order, OrderStatusChange
+from .notifications import enqueue_many
+from .presence import notify_users
+from .profile import invalidate_summaries
+
+logger = logging.getLogger(__name__)
+
+# Допустимые переходы: завершённые и отменённые заявки не переоткрываются
+TRANSITIONS = {
+    "new": {"in_progress", "completed", "cancelled"},
+    "in_progress": {"completed", "cancelled"},
+    "completed": set(),
+    "cancelled": set(),
+}
+STATUS_LABELS = dict(Order.STATUS_CHOICES)
+# Сколько заявок перечислять в сводке для менеджеров
+SUMMARY_LIMIT = 20
+
+ORDER_FIELDS = (
+    "id",
+    "status",
+    "user_id",
+    "user__username",
+    "user__profile__telegram_chat_id",
+    "car__brand",
+    "car__model",
+    "car__year",
+)
+
+
+def can_transition(from_status, to_status):
+    return to_status in TRANSITIONS.get(from_status, ())
+
+
+class TransitionResult:
+    def __init__(self, changed, skipped):
+        self.changed = changed
+        self.skipped = skipped
+
+
+def _car_label(row):
+    return f"{row['car__brand']} {row['car__model']} ({row['car__year']})"
+
+
+def transition_orders(queryset, status, user=None):
+    """Переводит заявки в status одним UPDATE; недопустимые переходы пропускает.
+
+    Возвращает TransitionResult с числом изменённых и пропущенных заявок.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # Блокируем строки: параллельное действие не запишет ту же смену дважды
+        rows = list(
+            queryset.select_for_update(of=("self",))
+            .order_by("id")
+            .values(*ORDER_FIELDS)
+        )
+        changes = [row for row in rows if can_transition(row["status"], status)]
+        if changes:
+            Order.objects.filter(id__in=[row["id"] for row in changes]).update(
+                status=status, updated_at=now
+            )
+            record_changes(changes, status, user, now)
+    return TransitionResult(len(changes), len(rows) - len(changes))
+
+
+def record_changes(rows, status, user=None, changed_at=None):
+    """История и уведомления для уже применённой смены статуса.
+
+    rows — словари с полями ORDER_FIELDS, где status — прежний статус.
+    """
+    changed_at = changed_at or timezone.now()
+    OrderStatusChange.objects.bulk_create(
+        [
+            OrderStatusChange(
+                order_id=row["id"],
+                from_status=row["status"],
+                to_status=status,
+                changed_by=user,
+                changed_at=changed_at,
+            )
+            for row in rows
+        ]
+    )
+    # Число активных заявок в сводке профиля изменилось
+    invalidate_summaries(row["user_id"] for row in rows)
+    username = user.username if user is not None else None
+    transaction.on_commit(lambda: notify_status_changes(rows, status, username))
+
+
+def record_order_change(order, from_status, user=None):
+    """Смена статуса одной заявки, сохранённой через save()."""
+    row = Order.objects.values(*ORDER_FIELDS).get(id=order.id)
+    record_changes([{**row, "status": from_status}], order.status, user)
+
+
+# ==============================
+# Уведомления
+# ==============================
+def notify_status_changes(rows, status, changed_by=None):
+    """Сводка менеджерам, сообщения покупателям в Telegram и в личный сокет."""
+    label = STATUS_LABELS.get(status, status)
+    lines = [
+        f"#{row['id']} {row['user__username']} — {_car_label(row)}"
+        for row in rows[:SUMMARY_LIMIT]
+    ]
+    if len(rows) > SUMMARY_LIMIT:
+        lines.append(f"… и ещё {len(rows) - SUMMARY_LIMIT}")
+    summary = f"🔄 *Заявки → {label}*: {len(rows)}"
+    if changed_by:
+        summary += f" (изменил {changed_by})"
+
+    messages = [(settings.TELEGRAM_CHAT_ID, "\n".join([summary, *lines]))]
+    messages += [
+        (
+            row["user__profile__telegram_chat_id"],
+            f"Ваша заявка #{row['id']} на {_car_label(row)}: {label}",
+        )
+        for row in rows
+        if row.get("user__profile__telegram_chat_id")
+    ]
+    enqueue_many(messages)
+
+    try:
+        async_to_sync(get_channel_layer().group_send)(
+            "admin_notifications",
+            {
+                "type": "orders_status_changed",
+                "status": status,
+                "changed_by": changed_by,
+                "orders": [
+                    {"order_id": row["id"], "previous": row["status"]}
+                    for row in rows
+                ],
+            },
+        )
+    except Exception:
+        logger.exception("Не удалось разослать смену статуса %s заявок", len(rows))
+
+    events = {}
+    for row in rows:
+        events.setdefault(row["user_id"], []).append(
+            {
+                "type": "order_status",
+                "order_id": row["id"],
+                "car": _car_label(row),
+                "status": status,
+                "status_label": label,
+                "previous": row["status"],
+            }
+        )
+    notify_users(events)
@@ -0,0 +1,125 @@
+# core/presence.py
+"""Присутствие пользователей: у кого открыт личный сокет уведомлений.
+
+Счётчик соединений пользователя лежит в общем кэше с TTL, клиент продлевает
+его пингом. Перед рассылкой в группы user_{id} онлайн проверяется одним
+get_many: на пользователей без соединения group_send не тратится.
+Счётчик не удаляется при нуле — иначе гонка с новым подключением могла бы
+стереть его; устаревшее значение само истечёт через PRESENCE_TTL.
+"""
+import asyncio
+import logging
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+
+from .metrics import Counter, registry
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_KEY = "presence:{}"
+
+user_events = registry.add(
+    Counter(
+        "user_notifications_total",
+        "Личные уведомления: отправлено и пропущено без соединения",
+        ("type", "result"),
+    )
+)
+
+
+def user_group(user_id):
+    return f"user_{user_id}"
+
+
+def _key(user_id):
+    return PRESENCE_KEY.format(user_id)
+
+
+# ==============================
+# Реестр соединений
+# ==============================
+def connect(user_id):
+    key = _key(user_id)
+    if cache.add(key, 1, settings.PRESENCE_TTL):
+        return
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        # Ключ истёк между add и incr
+        cache.add(key, 1, settings.PRESENCE_TTL)
+        return
+    if count < 1:
+        # Счётчик ушёл в минус после истечения — открыто как минимум это
+        cache.set(key, 1, settings.PRESENCE_TTL)
+    else:
+        cache.touch(key, settings.PRESENCE_TTL)
+
+
+def disconnect(user_id):
+    try:
+        cache.decr(_key(user_id))
+    except ValueError:
+        pass
+
+
+def heartbeat(user_id):
+    key = _key(user_id)
+    if not cache.touch(key, settings.PRESENCE_TTL):
+        cache.add(key, 1, settings.PRESENCE_TTL)
+
+
+def online_users(user_ids):
+    """Id пользователей с открытым соединением — один запрос к кэшу."""
+    keys = {_key(user_id): user_id for user_id in set(user_ids)}
+    if not keys:
+        return set()
+    return {keys[key] for key, count in cache.get_many(keys).items() if count > 0}
+
+
+# ==============================
+# Рассылка
+# ==============================
+async def send_to_users(events):
+    """Рассылает {user_id: [событие, ...]} в группы user_{id}, только онлайн.
+
+    Возвращает число отправленных событий.
+    """
+    online = await sync_to_async(online_users)(events)
+    sends = []
+    for user_id, items in events.items():
+        for event in items:
+            if user_id in online:
+                sends.append((user_id, event))
+            else:
+                user_events.inc(type=event["type"], result="offline")
+    if not sends:
+        return 0
+
+    # Все события разом: BatchingChannelLayer отправит их одной пачкой
+    layer = get_channel_layer()
+    results = await asyncio.gather(
+        *(layer.group_send(user_group(user_id), event) for user_id, event in sends),
+        return_exceptions=True,
+    )
+    sent = 0
+    for (user_id, event), result in zip(sends, results):
+        if isinstance(result, Exception):
+            logger.error(
+                "Не удалось отправить уведомление %s", user_id, exc_info=result
+            )
+            user_events.inc(type=event["type"], result="error")
+        else:
+            user_events.inc(type=event["type"], result="sent")
+            sent += 1
+    return sent
+
+
+def notify_users(events):
+    """Синхронная обёртка send_to_users для сигналов и on_commit."""
+    events = {user_id: items for user_id, items in events.items() if items}
+    if not events:
+        return 0
+    return async_to_sync(send_to_users)(events)
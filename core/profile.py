@@ -0,0 +1,129 @@
+# core/profile.py
+"""Данные страницы профиля: узкие проекции, страницы заявок и кэш сводки.
+
+Время ответа не зависит от длины истории: избранное и заявки читаются
+страницами по индексам (user, -id), последние просмотры — с лимитом, всё
+с select_related и only() по полям шаблона, счётчики сводки — из кэша. Кэш сбрасывается
+при изменении Favorite, Order и ViewHistory (сигналы, массовые записи
+просмотров и смена статусов заявок).
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Favorite, Order, ViewHistory
+
+SUMMARY_KEY = "profile:summary:{}"
+SUMMARY_FIELDS = ("favorites", "views", "orders", "active_orders")
+# Заявки, которые ещё ждут решения
+ACTIVE_STATUSES = ("new", "in_progress")
+# Сколько последних просмотров показывать
+RECENT_VIEWS = 10
+
+# Поля машины для карточек; сам FK car нужен only() вместе с select_related
+CAR_CARD_FIELDS = ("car", "car__brand", "car__model", "car__price", "car__photo")
+
+
+# ==============================
+# Сводка
+# ==============================
+def _count(model, **filters):
+    rows = (
+        model.objects.filter(user_id=OuterRef("id"), **filters)
+        .order_by()
+        .values("user_id")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    return Coalesce(Subquery(rows, output_field=IntegerField()), Value(0))
+
+
+def get_summary(user_id):
+    """Счётчики профиля: из кэша или одним запросом с подзапросами."""
+    key = SUMMARY_KEY.format(user_id)
+    summary = cache.get(key)
+    if summary is None:
+        # Имена аннотаций не должны совпадать с обратными связями User
+        row = (
+            User.objects.filter(id=user_id)
+            .annotate(
+                favorites_total=_count(Favorite),
+                views_total=_count(ViewHistory),
+                orders_total=_count(Order),
+                active_orders_total=_count(Order, status__in=ACTIVE_STATUSES),
+            )
+            .values_list(*(f"{field}_total" for field in SUMMARY_FIELDS))
+            .first()
+        )
+        summary = dict(zip(SUMMARY_FIELDS, row or (0,) * len(SUMMARY_FIELDS)))
+        cache.set(key, summary, settings.PROFILE_SUMMARY_TTL)
+    return summary
+
+
+def invalidate_summaries(user_ids):
+    cache.delete_many([SUMMARY_KEY.format(user_id) for user_id in set(user_ids)])
+
+
+# ==============================
+# Списки
+# ==============================
+def parse_cursor(value):
+    """Курсор страницы списка — id последней показанной строки; мусор — с начала."""
+    try:
+        return int(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _page(queryset, cursor, limit):
+    # Новее-старее по id: (строки, курсор следующей страницы или None)
+    queryset = queryset.order_by("-id")
+    if cursor is not None:
+        queryset = queryset.filter(id__lt=cursor)
+    rows = list(queryset[: limit + 1])
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def orders_page(user, cursor=None, limit=None):
+    """Страница заявок новее-старее: (заявки, курсор следующей или None)."""
+    queryset = (
+        Order.objects.filter(user=user)
+        .select_related("car")
+        .only("id", "status", "created_at", "car", "car__brand", "car__model")
+    )
+    return _page(queryset, cursor, limit or settings.PROFILE_ORDERS_PAGE_SIZE)
+
+
+def favorites_page(user, cursor=None, limit=None):
+    """Страница избранного, последние добавленные первыми."""
+    queryset = (
+        Favorite.objects.filter(user=user)
+        .select_related("car")
+        .only("id", "added_at", *CAR_CARD_FIELDS)
+    )
+    return _page(queryset, cursor, limit or settings.PROFILE_FAVORITES_PAGE_SIZE)
+
+
+def get_profile_data(user, orders_cursor=None, favorites_cursor=None):
+    """Контекст страницы профиля: сводка, избранное, просмотры, заявки."""
+    views = (
+        ViewHistory.objects.filter(user=user)
+        .select_related("car")
+        .only("id", "viewed_at", *CAR_CARD_FIELDS)
+        .order_by("-viewed_at")[:RECENT_VIEWS]
+    )
+    orders, next_orders = orders_page(user, orders_cursor)
+    favorites, next_favorites = favorites_page(user, favorites_cursor)
+    return {
+        "summary": get_summary(user.id),
+        "favorites": favorites,
+        "favorites_cursor": next_favorites,
+        "favorites_paged": favorites_cursor is not None,
+        "views": list(views),
+        "orders": orders,
+        "orders_cursor": next_orders,
+        "orders_paged": orders_cursor is not None,
+    }
@@ -0,0 +1,161 @@
+# core/recommendations.py
+"""Рекомендации: похожие машины по совместным просмотрам, избранному и характеристикам.
+
+Расчёт — периодическая команда build_recommendations. Матрица «пользователь ×
+машина» хранится разреженно (словари), поведенческое сходство — косинус её
+столбцов, то есть XᵀX, посчитанное только по ненулевым парам. К нему
+добавляется сходство по марке, году и цене. Top-K соседей каждой машины
+ложатся в CarSimilarity, и вьюхи читают их одним запросом по индексу.
+"""
+import heapq
+import math
+from collections import defaultdict
+from itertools import combinations
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Sum
+
+from .filters import available_cars
+from .models import Car, CarSimilarity, Favorite, ViewHistory
+
+# Вес действия в матрице: избранное говорит об интересе сильнее просмотра
+VIEW_WEIGHT = 1.0
+FAVORITE_WEIGHT = 3.0
+# Разница в годах, при которой сходство по году падает до нуля
+YEAR_SPAN = 5
+
+
+# ==============================
+# Расчёт
+# ==============================
+def _user_items(max_items):
+    """{user_id: {car_id: вес}} — последние max_items просмотров и всё избранное."""
+    items = defaultdict(dict)
+    views = (
+        ViewHistory.objects.order_by("user_id", "-viewed_at")
+        .values_list("user_id", "car_id")
+        .iterator(chunk_size=5000)
+    )
+    for user_id, car_id in views:
+        user_items = items[user_id]
+        if len(user_items) < max_items:
+            user_items[car_id] = VIEW_WEIGHT
+    favorites = Favorite.objects.values_list("user_id", "car_id").iterator(
+        chunk_size=5000
+    )
+    for user_id, car_id in favorites:
+        items[user_id][car_id] = FAVORITE_WEIGHT
+    return items
+
+
+def behavior_similarity(user_items):
+    """Косинус между машинами по пользователям: {(a, b): сходство}, a < b."""
+    norms = defaultdict(float)
+    dots = defaultdict(float)
+    for items in user_items.values():
+        for car_id, weight in items.items():
+            norms[car_id] += weight * weight
+        for (a, weight_a), (b, weight_b) in combinations(sorted(items.items()), 2):
+            dots[a, b] += weight_a * weight_b
+    return {
+        (a, b): dot / math.sqrt(norms[a] * norms[b]) for (a, b), dot in dots.items()
+    }
+
+
+def attribute_similarity(a, b):
+    """Сходство машин одной марки по году и цене, от 0 до 1."""
+    year = max(0.0, 1 - abs(a["year"] - b["year"]) / YEAR_SPAN)
+    low, high = sorted((a["price"], b["price"]))
+    price = float(low / high) if high else 1.0
+    return (year + price) / 2
+
+
+def _attribute_pairs(cars, window):
+    # Сравниваем только машины одной марки и только соседей по цене:
+    # O(n · window) вместо всех пар каталога
+    by_brand = defaultdict(list)
+    for car in cars:
+        by_brand[car["brand"].lower()].append(car)
+    for group in by_brand.values():
+        group.sort(key=lambda car: car["price"])
+        for i, car in enumerate(group):
+            for other in group[i + 1 : i + 1 + window]:
+                yield car["id"], other["id"], attribute_similarity(car, other)
+
+
+def build_similarities(top_k=None):
+    """Пересчитывает CarSimilarity целиком. Возвращает число записанных строк."""
+    top_k = top_k or settings.RECOMMENDATIONS_TOP_K
+    behavior_weight = settings.RECOMMENDATIONS_BEHAVIOR_WEIGHT
+    attribute_weight = settings.RECOMMENDATIONS_ATTRIBUTE_WEIGHT
+
+    cars = list(Car.objects.values("id", "brand", "year", "price", "status"))
+    # Рекомендуем только то, что можно купить; источником может быть любая машина
+    available = {car["id"] for car in cars if car["status"] == "available"}
+
+    scores = defaultdict(lambda: defaultdict(float))
+    user_items = _user_items(settings.RECOMMENDATIONS_MAX_USER_ITEMS)
+    for (a, b), similarity in behavior_similarity(user_items).items():
+        scores[a][b] += behavior_weight * similarity
+        scores[b][a] += behavior_weight * similarity
+    for a, b, similarity in _attribute_pairs(cars, window=top_k):
+        scores[a][b] += attribute_weight * similarity
+        scores[b][a] += attribute_weight * similarity
+
+    rows = []
+    for car_id, row in scores.items():
+        pairs = [(score, other) for other, score in row.items() if other in available]
+        best = heapq.nlargest(top_k, pairs)
+        rows += [
+            CarSimilarity(car_id=car_id, similar_id=other, score=score, rank=rank)
+            for rank, (score, other) in enumerate(best, start=1)
+        ]
+
+    # Читатели видят старую таблицу до коммита, пустой — никогда
+    with transaction.atomic():
+        CarSimilarity.objects.all().delete()
+        CarSimilarity.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+# ==============================
+# Выдача
+# ==============================
+def similar_cars(car_id, limit=None):
+    """Похожие машины в наличии — один запрос по индексу (car_id, rank)."""
+    limit = limit or settings.RECOMMENDATIONS_TOP_K
+    return list(
+        available_cars()
+        .filter(similar_to__car_id=car_id)
+        .order_by("similar_to__rank")[:limit]
+    )
+
+
+def recommended_for(user, limit=None):
+    """Машины «для вас»: соседи последних просмотров и избранного пользователя.
+
+    Один запрос: действия пользователя — подзапросы, оценки соседей суммируются
+    в БД. Без истории или без рассчитанных соседей — популярные машины.
+    """
+    limit = limit or settings.RECOMMENDATIONS_TOP_K
+    queryset = available_cars()
+    if user.is_authenticated:
+        favorites = Favorite.objects.filter(user=user).values("car_id")
+        recent = (
+            ViewHistory.objects.filter(user=user)
+            .order_by("-viewed_at")
+            .values("car_id")[: settings.RECOMMENDATIONS_SEED_ITEMS]
+        )
+        # Уже добавленное в избранное и только что просмотренное не предлагаем
+        queryset = queryset.exclude(id__in=favorites).exclude(id__in=recent)
+        cars = list(
+            queryset.filter(
+                Q(similar_to__car_id__in=recent) | Q(similar_to__car_id__in=favorites)
+            )
+            .annotate(score=Sum("similar_to__score"))
+            .order_by("-score", "-id")[:limit]
+        )
+        if cars:
+            return cars
+    return list(queryset.order_by("-views_count", "-id")[:limit])
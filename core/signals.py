@@ -1,9 +1,29 @@
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.contrib.auth.models import User
 from django.dispatch import receiver
-from .models import Order
-from .telegram import send_telegram_message
+from .alerts import car_alerts
+from .broadcast import car_updates
+from .cache import bump_cars, bump_catalog
+from .chat import invalidate_car, invalidate_staff
+from .counters import COUNTERS, adjust, release_user
+from .fulltext import INDEXED_FIELDS, index_object, reindex, unindex_object
+from .images import schedule_derivatives
+from .models import (
+    BROADCAST_FIELDS,
+    Car,
+    Favorite,
+    News,
+    Order,
+    UserProfile,
+    ViewHistory,
+    car_activity_deleted,
+    cars_updated,
+)
+from .notifications import enqueue
+from .orders import record_order_change
+from .profile import invalidate_summaries
 
 
 @receiver(post_save, sender=Order)
@@ -19,8 +39,8 @@ def notify_admin_on_new_order(sender, instance, created, **kwargs):
             f"Создана: `{instance.created_at.strftime('%Y-%m-%d %H:%M')}`"
         )
 
-        # Отправляем ВСЕГДА
-        send_telegram_message(message)
+        # Отправляем ВСЕГДА — через очередь, запрос не ждёт Telegram
+        enqueue(message)
 
         # WebSocket-уведомление
         channel_layer = get_channel_layer()
@@ -34,3 +54,163 @@ def notify_admin_on_new_order(sender, instance, created, **kwargs):
                 "created_at": instance.created_at.isoformat(),
             },
         )
+
+
+# Смена статуса заявки через save() — в историю и уведомления
+@receiver(post_save, sender=Order)
+def record_order_status_change(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_loaded_status", None)
+    if created or previous is None or previous == instance.status:
+        return
+    instance._loaded_status = instance.status
+    record_order_change(instance, previous, getattr(instance, "_changed_by", None))
+
+
+# Полнотекстовый индекс обновляется вместе с объектом
+@receiver(post_save, sender=Car)
+@receiver(post_save, sender=News)
+def update_search_index(sender, instance, **kwargs):
+    index_object(instance)
+
+
+# update() и массовые записи сигналов post_save не шлют
+@receiver(cars_updated, sender=Car)
+def update_bulk_search_index(sender, car_ids, fields, **kwargs):
+    if fields.intersection(INDEXED_FIELDS[Car]):
+        reindex(Car, car_ids)
+
+
+@receiver(post_delete, sender=Car)
+@receiver(post_delete, sender=News)
+def remove_from_search_index(sender, instance, **kwargs):
+    unindex_object(instance)
+
+
+# Кэш маршрутизации чатов
+@receiver(post_save, sender=Car)
+@receiver(post_delete, sender=Car)
+def invalidate_chat_car(sender, instance, **kwargs):
+    invalidate_car(instance.id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_chat_staff(sender, instance, update_fields=None, **kwargs):
+    # Вход пользователя обновляет только last_login — список менеджеров не меняется
+    if update_fields and set(update_fields) == {"last_login"}:
+        return
+    invalidate_staff(instance)
+
+
+# Оповещения об избранном: прежние цена и статус — в сборщик core/alerts.py.
+# Подключён раньше broadcast_car_change: тот перезаписывает _broadcast_state
+@receiver(post_save, sender=Car)
+def track_car_alerts(sender, instance, created, **kwargs):
+    loaded = getattr(instance, "_broadcast_state", None)
+    if created or loaded is None or loaded == instance.broadcast_state():
+        return
+    car_alerts.record({instance.id: loaded})
+
+
+@receiver(cars_updated, sender=Car)
+def track_cars_bulk_alerts(sender, previous=None, **kwargs):
+    if previous:
+        car_alerts.record(previous)
+
+
+# Цена и статус машин — клиентам по WebSocket, пачками
+@receiver(post_save, sender=Car)
+def broadcast_car_change(sender, instance, created, **kwargs):
+    if created or not instance.broadcast_changed():
+        return
+    instance._broadcast_state = instance.broadcast_state()
+    car_updates.schedule([instance.id])
+
+
+@receiver(cars_updated, sender=Car)
+def broadcast_cars_bulk_change(sender, car_ids, fields, **kwargs):
+    if fields.intersection(BROADCAST_FIELDS):
+        car_updates.schedule(car_ids)
+
+
+# Кэш карточек и страниц каталога: новая версия вместо поиска ключей
+@receiver(post_save, sender=Car)
+@receiver(post_delete, sender=Car)
+def invalidate_car_cache(sender, instance, **kwargs):
+    bump_cars([instance.id])
+
+
+@receiver(cars_updated, sender=Car)
+def invalidate_cars_cache(sender, car_ids, **kwargs):
+    bump_cars(car_ids)
+
+
+@receiver(post_save, sender=News)
+@receiver(post_delete, sender=News)
+def invalidate_news_cache(sender, instance, **kwargs):
+    bump_catalog()
+
+
+# Уменьшенные копии изображений — в фоне после сохранения
+@receiver(post_save, sender=Car)
+def build_car_photo_variants(sender, instance, **kwargs):
+    # Готовые варианты меняют HTML карточки — сбрасываем её кэш
+    car_id = instance.id
+    schedule_derivatives(instance.photo.name, on_done=lambda: bump_cars([car_id]))
+
+
+@receiver(post_save, sender=News)
+def build_news_image_variants(sender, instance, **kwargs):
+    schedule_derivatives(instance.image.name, on_done=bump_catalog)
+
+
+@receiver(post_save, sender=UserProfile)
+def build_avatar_variants(sender, instance, **kwargs):
+    schedule_derivatives(instance.avatar.name)
+
+
+
+# Счётчики популярности машин: +1 при создании строки, -1 при удалении.
+# bulk_create сигналов не шлёт — там счётчики правит вызывающий код.
+# Приёмников post_delete у строк нет: с ними Django удалял бы их каскадом
+# по одной, а не одним DELETE
+@receiver(post_save, sender=ViewHistory)
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=Order)
+def increment_car_counter(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        adjust(COUNTERS[sender], [instance.car_id])
+
+
+@receiver(car_activity_deleted)
+def decrement_car_counter(sender, car_ids, **kwargs):
+    adjust(COUNTERS[sender], car_ids, delta=-1)
+
+
+@receiver(pre_delete, sender=User)
+def release_user_counters(sender, instance, **kwargs):
+    # Строки пользователя уйдут каскадом — вычитаем их разом
+    release_user(instance.id)
+
+
+# Сводка профиля: число избранного, просмотров и заявок
+@receiver(post_save, sender=ViewHistory)
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=Order)
+def invalidate_profile_summary(sender, instance, **kwargs):
+    invalidate_summaries([instance.user_id])
+
+
+@receiver(car_activity_deleted)
+def invalidate_profile_summaries(sender, user_ids, **kwargs):
+    invalidate_summaries(user_ids)
+
+
+@receiver(pre_delete, sender=Car)
+def invalidate_car_profile_summaries(sender, instance, **kwargs):
+    # Строки машины уйдут каскадом — у их владельцев поменяется сводка
+    first, *rest = (
+        model.objects.filter(car=instance).order_by().values_list("user_id")
+        for model in COUNTERS
+    )
+    invalidate_summaries(user_id for user_id, in first.union(*rest))
@@ -1,14 +1,83 @@
-import asyncio
-from telegram import Bot
+import logging
+from datetime import timedelta
+
 from django.conf import settings
+from django.utils.module_loading import import_string
+from telegram import Bot
+from telegram.error import RetryAfter
+from telegram.request import HTTPXRequest
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimited(Exception):
+    """Транспорт упёрся в лимит отправки, повторить через retry_after секунд."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Превышен лимит отправки, повтор через {retry_after} с")
+        self.retry_after = retry_after
+
+
+class TelegramTransport:
+    # Один Bot и один пул HTTP-соединений на всё время жизни воркера
+    def __init__(self, token=None):
+        self.bot = Bot(
+            token=token or settings.TELEGRAM_BOT_TOKEN,
+            request=HTTPXRequest(connection_pool_size=8),
+        )
+
+    async def start(self):
+        await self.bot.initialize()
+
+    async def close(self):
+        await self.bot.shutdown()
+
+    async def send(self, chat_id, text):
+        try:
+            await self.bot.send_message(
+                chat_id=chat_id, text=text, parse_mode="Markdown"
+            )
+        except RetryAfter as exc:
+            retry_after = exc.retry_after
+            if isinstance(retry_after, timedelta):
+                retry_after = retry_after.total_seconds()
+            raise RateLimited(retry_after) from exc
+
+
+class FakeTransport:
+    # Локальный транспорт без сети: для разработки и тестов.
+    # errors — исключения, которые по очереди выбросят ближайшие отправки.
+    def __init__(self, errors=()):
+        self.sent = []
+        self.errors = list(errors)
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def send(self, chat_id, text):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append((chat_id, text))
+        logger.info("Telegram (fake) → %s: %s", chat_id, text)
+
+
+TRANSPORTS = {
+    "telegram": TelegramTransport,
+    "fake": FakeTransport,
+}
+
 
+def get_transport():
+    name = settings.TELEGRAM_TRANSPORT
+    transport_class = TRANSPORTS.get(name) or import_string(name)
+    return transport_class()
 
-async def send_telegram_message_async(message):
-    bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
-    await bot.send_message(
-        chat_id=settings.TELEGRAM_CHAT_ID, text=message, parse_mode="Markdown"
-    )
 
+def send_telegram_message(message, chat_id=None):
+    # Отправка идёт через очередь: сообщение доставит воркер уведомлений
+    from .notifications import enqueue
 
-def send_telegram_message(message):
-    asyncio.run(send_telegram_message_async(message))
+    return enqueue(message, chat_id=chat_id)
@@ -0,0 +1,13 @@
+# core/templatetags/catalog_cache.py
+from django import template
+from django.utils.safestring import mark_safe
+
+from core.cache import render_car_cards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def car_cards(context, cars):
+    """{% car_cards cars %} — карточки машин через кэш фрагментов."""
+    return mark_safe(render_car_cards(cars, context["user"]))
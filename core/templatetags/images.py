@@ -0,0 +1,38 @@
+# core/templatetags/images.py
+from django import template
+from django.utils.html import format_html
+
+from core.images import variant_url, variant_urls
+
+register = template.Library()
+
+
+@register.simple_tag
+def image_url(field, variant, fmt="jpeg"):
+    """{% image_url car.photo "sm" %} — URL уменьшенной копии (или оригинала)."""
+    return variant_url(field, variant, fmt) or ""
+
+
+@register.simple_tag
+def picture(field, variant, alt="", css_class="", style=""):
+    """<picture> с WebP и JPEG нужного размера; до генерации — оригинал."""
+    if not field:
+        return ""
+    urls = variant_urls(field, variant)
+    if urls is None:
+        return format_html(
+            '<img src="{}" class="{}" alt="{}" style="{}" loading="lazy">',
+            field.url,
+            css_class,
+            alt,
+            style,
+        )
+    return format_html(
+        '<picture><source srcset="{}" type="image/webp">'
+        '<img src="{}" class="{}" alt="{}" style="{}" loading="lazy"></picture>',
+        urls["webp"],
+        urls["jpeg"],
+        css_class,
+        alt,
+        style,
+    )
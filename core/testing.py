@@ -0,0 +1,43 @@
+# core/testing.py
+"""Помощники для тестов: ловят N+1 по бюджету SQL-запросов из QUERY_BUDGETS."""
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+from .metrics import query_budget
+
+
+@contextmanager
+def assert_max_queries(budget, using=DEFAULT_DB_ALIAS, label="блок"):
+    """with assert_max_queries(5): ... — AssertionError со списком SQL сверх бюджета."""
+    with CaptureQueriesContext(connections[using]) as context:
+        yield context
+    if len(context) > budget:
+        queries = "\n".join(
+            f"{number}. {query['sql']}"
+            for number, query in enumerate(context.captured_queries, start=1)
+        )
+        raise AssertionError(
+            f"{label}: {len(context)} SQL-запросов при бюджете {budget}\n{queries}"
+        )
+
+
+class QueryBudgetMixin:
+    """Для TestCase: self.assertWithinQueryBudget("/profile/") после force_login.
+
+    Бюджет берётся из QUERY_BUDGETS по имени URL, если не передан явно.
+    """
+
+    def assertWithinQueryBudget(self, path, budget=None, method="get", **kwargs):
+        client = kwargs.pop("client", None) or self.client
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as context:
+            response = getattr(client, method)(path, **kwargs)
+        view = response.resolver_match.view_name if response.resolver_match else path
+        budget = query_budget(view) if budget is None else budget
+        if len(context) > budget:
+            queries = "\n".join(query["sql"] for query in context.captured_queries)
+            self.fail(
+                f"{view}: {len(context)} SQL-запросов при бюджете {budget}\n{queries}"
+            )
+        return response
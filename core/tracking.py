@@ -0,0 +1,127 @@
+# core/tracking.py
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection
+
+from .counters import adjust
+from .models import ViewHistory
+from .profile import invalidate_summaries
+
+logger = logging.getLogger(__name__)
+
+
+def record_views(user_id, car_ids):
+    """Записывает просмотры одного пользователя: один SELECT и один INSERT."""
+    car_ids = set(car_ids)
+    if not car_ids:
+        return 0
+
+    # Разность множеств: какие машины пользователь ещё не видел
+    seen = set(
+        ViewHistory.objects.filter(user_id=user_id, car_id__in=car_ids).values_list(
+            "car_id", flat=True
+        )
+    )
+    missing = car_ids - seen
+    if missing:
+        ViewHistory.objects.bulk_create(
+            [ViewHistory(user_id=user_id, car_id=car_id) for car_id in missing],
+            ignore_conflicts=True,
+        )
+        adjust("views_count", missing)
+        invalidate_summaries([user_id])
+    return len(missing)
+
+
+class ViewBuffer:
+    """Копит пары (user_id, car_id) между запросами и пишет их пачками.
+
+    Пачка уходит при накоплении max_size пар — в запросе, который её
+    заполнил, — или по таймеру через flush_interval секунд после первой
+    пары, даже если новых запросов больше нет.
+    """
+
+    def __init__(self, max_size, flush_interval):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def add(self, user_id, car_ids):
+        with self._lock:
+            self._pending.update((user_id, car_id) for car_id in car_ids)
+            full = len(self._pending) >= self.max_size
+            if full or self._timer is not None or not self._pending:
+                timer = None
+            else:
+                timer = self._timer = threading.Timer(
+                    self.flush_interval, self._flush_in_thread
+                )
+                timer.daemon = True
+        if timer is not None:
+            timer.start()
+        elif full:
+            self.flush()
+
+    def _flush_in_thread(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Не удалось записать историю просмотров")
+        finally:
+            # Соединение с БД в потоке таймера — своё, закрываем его сами
+            connection.close()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, set()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return 0
+
+        # Одним запросом отсекаем пары, которые уже есть в БД
+        user_ids = {user_id for user_id, _ in pending}
+        car_ids = {car_id for _, car_id in pending}
+        existing = set(
+            ViewHistory.objects.filter(
+                user_id__in=user_ids, car_id__in=car_ids
+            ).values_list("user_id", "car_id")
+        )
+        missing = pending - existing
+        if missing:
+            ViewHistory.objects.bulk_create(
+                [ViewHistory(user_id=u, car_id=c) for u, c in missing],
+                batch_size=500,
+                ignore_conflicts=True,
+            )
+            adjust("views_count", [car_id for _, car_id in missing])
+            invalidate_summaries(user_id for user_id, _ in missing)
+        return len(missing)
+
+    def __len__(self):
+        return len(self._pending)
+
+
+view_buffer = ViewBuffer(
+    max_size=settings.VIEW_HISTORY_BUFFER_SIZE,
+    flush_interval=settings.VIEW_HISTORY_FLUSH_INTERVAL,
+)
+
+# Не теряем накопленные просмотры при остановке процесса
+atexit.register(view_buffer.flush)
+
+
+def track_views(user, car_ids):
+    """Точка входа для вьюх: пишет сразу или через буфер — по настройкам."""
+    if not user.is_authenticated:
+        return
+    if settings.VIEW_HISTORY_BUFFER_SIZE > 0:
+        view_buffer.add(user.id, car_ids)
+    else:
+        record_views(user.id, car_ids)
@@ -8,5 +8,6 @@ urlpatterns = [
 websocket_urlpatterns = [
     path("ws/chat/<int:car_id>/", consumers.ChatConsumer.as_asgi()),
     path("ws/notifications/", consumers.NotificationConsumer.as_asgi()),
+    path("ws/user/", consumers.UserNotificationConsumer.as_asgi()),
     path("ws/cars/", consumers.CarConsumer.as_asgi()),
 ]
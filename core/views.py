@@ -1,19 +1,176 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.contrib import messages
-from .forms import OrderForm
-from .models import Car, ViewHistory, Favorite, Order
+from .cache import cache_anonymous_page, stats as cache_stats
+from .catalog import InvalidCursor, get_catalog_page, serialize_car
+from .filters import available_cars, compute_facets, filter_cars
+from .forms import CarFilterForm, OrderForm
+from .fulltext import search
+from .metrics import render as render_metrics
+from .models import Car, Favorite, Order, News
+from .profile import get_profile_data, parse_cursor
+from .recommendations import recommended_for, similar_cars
+from .tracking import track_views
 
 
+def _filtered_cars(request):
+    # Фильтры каталога из GET-параметров; при ошибках — весь каталог
+    form = CarFilterForm(request.GET or None)
+    queryset = available_cars()
+    if form.is_bound and form.is_valid():
+        queryset = filter_cars(queryset, form.cleaned_data)
+    return form, queryset
+
+
+def _ordering(form):
+    if form.is_bound and form.is_valid():
+        return form.cleaned_data.get("sort") or None
+    return None
+
+
+def _filter_query(request):
+    # Строка фильтров без курсора — для ссылки «Показать ещё»
+    params = request.GET.copy()
+    params.pop("cursor", None)
+    return params.urlencode()
+
+
+@cache_anonymous_page
 def home(request):
-    cars = Car.objects.filter(status="available").order_by("-created_at")
+    form, queryset = _filtered_cars(request)
+    ordering = _ordering(form)
+    try:
+        page = get_catalog_page(
+            queryset, cursor=request.GET.get("cursor"), ordering=ordering
+        )
+    except InvalidCursor:
+        page = get_catalog_page(queryset, ordering=ordering)
+
+    # Если пользователь залогинен — записываем просмотр авто на странице
+    # (пачкой, без get_or_create на каждую машину)
+    track_views(request.user, [car.id for car in page.cars])
+
+    return render(
+        request,
+        "home.html",
+        {
+            "cars": page.cars,
+            "next_cursor": page.next_cursor,
+            "filter_form": form,
+            "filter_query": _filter_query(request),
+        },
+    )
+
+
+@cache_anonymous_page
+def car_list_api(request):
+    # JSON-версия каталога для бесконечной прокрутки
+    form, queryset = _filtered_cars(request)
+    try:
+        limit = _limit(request)
+        page = get_catalog_page(
+            queryset,
+            cursor=request.GET.get("cursor"),
+            limit=limit,
+            ordering=_ordering(form),
+        )
+    except (ValueError, InvalidCursor) as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+
+    track_views(request.user, [car.id for car in page.cars])
+
+    html = render_to_string(
+        "includes/car_cards.html", {"cars": page.cars}, request=request
+    )
+    return JsonResponse(
+        {
+            "results": [serialize_car(car) for car in page.cars],
+            "next_cursor": page.next_cursor,
+            "html": html,
+        }
+    )
+
+
+def car_search_api(request):
+    # Публичный поиск: отфильтрованная страница каталога + счётчики фасетов
+    form = CarFilterForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({"errors": form.errors}, status=400)
+
+    queryset = filter_cars(available_cars(), form.cleaned_data)
+    try:
+        page = get_catalog_page(
+            queryset,
+            cursor=request.GET.get("cursor"),
+            ordering=form.cleaned_data["sort"] or None,
+        )
+    except InvalidCursor as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+
+    return JsonResponse(
+        {
+            "results": [serialize_car(car) for car in page.cars],
+            "next_cursor": page.next_cursor,
+            "facets": compute_facets(form.cleaned_data),
+        }
+    )
 
-    # Если пользователь залогинен — записываем просмотр всех авто на главной
-    if request.user.is_authenticated:
-        for car in cars:
-            ViewHistory.objects.get_or_create(user=request.user, car=car)
 
-    return render(request, "home.html", {"cars": cars})
+def _limit(request):
+    return min(max(int(request.GET.get("limit", 0)), 0), 100) or None
+
+
+def similar_cars_api(request, car_id):
+    # Похожие машины — из таблицы, рассчитанной build_recommendations
+    try:
+        cars = similar_cars(car_id, limit=_limit(request))
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    return JsonResponse({"results": [serialize_car(car) for car in cars]})
+
+
+def recommendations_api(request):
+    # «Рекомендуем вам»; анонимам и новым пользователям — популярные машины
+    try:
+        cars = recommended_for(request.user, limit=_limit(request))
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    return JsonResponse({"results": [serialize_car(car) for car in cars]})
+
+
+@staff_member_required
+def cache_stats_api(request):
+    # Попадания/промахи кэша карточек и страниц — для подбора TTL и размера
+    return JsonResponse(
+        {"backend": settings.CACHES["default"]["BACKEND"], **cache_stats.snapshot()}
+    )
+
+
+def metrics_view(request):
+    # Prometheus ходит с токеном, сотрудники — по сессии
+    token = settings.METRICS_TOKEN
+    authorized = token and request.headers.get("Authorization") == f"Bearer {token}"
+    if not (authorized or request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+def search_view(request):
+    # Поиск по сайту: авто в наличии и активные акции, по релевантности
+    query = request.GET.get("q", "").strip()
+    cars = news = []
+    if query:
+        cars = search(available_cars(), query, limit=settings.CATALOG_PAGE_SIZE)
+        news = search(News.objects.filter(is_active=True), query, limit=10)
+    return render(
+        request, "search.html", {"query": query, "cars": cars, "news": news}
+    )
 
 
 @login_required
@@ -56,18 +213,9 @@ def thanks(request):
 
 @login_required
 def profile(request):
-    user = request.user
-    favorites = Favorite.objects.filter(user=user).select_related("car")
-    views = (
-        ViewHistory.objects.filter(user=user)
-        .select_related("car")
-        .order_by("-viewed_at")[:10]
+    data = get_profile_data(
+        request.user,
+        orders_cursor=parse_cursor(request.GET.get("orders_cursor")),
+        favorites_cursor=parse_cursor(request.GET.get("favorites_cursor")),
     )
-    orders = user.orders.all().select_related("car")
-
-    context = {
-        "favorites": favorites,
-        "views": views,
-        "orders": orders,
-    }
-    return render(request, "users/profile.html", context)
+    return render(request, "users/profile.html", data)
@@ -4,7 +4,10 @@ let currentCarId = null;
 
 function openChat(carId) {
   currentCarId = carId;
-  const modal = new bootstrap.Modal(document.getElementById('chatModal'));
+  // Открытый чат — для notifications.js: его ответы не дублируем всплывашкой
+  window.openChatCarId = carId;
+  const modalElement = document.getElementById('chatModal');
+  const modal = new bootstrap.Modal(modalElement);
   modal.show();
 
   // Подключаемся к WebSocket
@@ -12,9 +15,11 @@ function openChat(carId) {
     chatSocket.close();
   }
 
-  chatSocket = new WebSocket(
+  const socket = chatSocket = new WebSocket(
     'ws://' + window.location.host + '/ws/chat/' + carId + '/'
   );
+  // Закрыли окно — закрываем и соединение
+  modalElement.addEventListener('hidden.bs.modal', () => socket.close(), { once: true });
 
   chatSocket.onopen = function (e) {
     console.log('WebSocket подключен к чату по авто ID: ' + carId);
@@ -36,14 +41,20 @@ function openChat(carId) {
 
   chatSocket.onclose = function (e) {
     console.log('WebSocket отключен');
+    // Прежнее соединение закрывается уже после открытия нового чата
+    if (chatSocket !== socket) {
+      return;
+    }
+    chatSocket = null;
+    window.openChatCarId = null;
     document.getElementById('chat-messages').innerHTML = '<div class="alert alert-warning">Соединение закрыто.</div>';
   };
 
   // Отправка сообщения
   document.getElementById('send-chat-btn').onclick = function () {
     const input = document.getElementById('chat-input');
-    if (input.value && chatSocket.readyState === WebSocket.OPEN) {
-      chatSocket.send(JSON.stringify({
+    if (input.value && socket.readyState === WebSocket.OPEN) {
+      socket.send(JSON.stringify({
         'message': input.value
       }));
       input.value = '';
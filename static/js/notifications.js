@@ -0,0 +1,66 @@
+// static/js/notifications.js
+// Личные уведомления: смена статуса заявок, ответы в чате, избранное
+let userSocket = null;
+let heartbeatTimer = null;
+
+function showUserNotification(text) {
+  const container = document.getElementById('user-notifications');
+  if (!container) {
+    return;
+  }
+  const alert = document.createElement('div');
+  alert.className = 'alert alert-info alert-dismissible fade show shadow-sm';
+  alert.textContent = text;
+  const close = document.createElement('button');
+  close.type = 'button';
+  close.className = 'btn-close';
+  close.dataset.bsDismiss = 'alert';
+  alert.appendChild(close);
+  container.appendChild(alert);
+  setTimeout(() => alert.remove(), 10000);
+}
+
+function applyOrderStatus(data) {
+  // Статус заявки на странице профиля — без перезагрузки
+  const status = document.querySelector(`[data-order-id="${data.order_id}"] .order-status`);
+  if (status) {
+    status.textContent = data.status_label;
+  }
+  showUserNotification(`Заявка #${data.order_id} на ${data.car}: ${data.status_label}`);
+}
+
+function connectUserNotifications() {
+  userSocket = new WebSocket('ws://' + window.location.host + '/ws/user/');
+
+  userSocket.onmessage = function (e) {
+    const data = JSON.parse(e.data);
+    if (data.type === 'welcome') {
+      // Пинг продлевает присутствие: без него сервер перестанет слать события
+      clearInterval(heartbeatTimer);
+      heartbeatTimer = setInterval(() => {
+        if (userSocket.readyState === WebSocket.OPEN) {
+          userSocket.send(JSON.stringify({ 'action': 'ping' }));
+        }
+      }, data.heartbeat * 1000);
+    } else if (data.type === 'order_status') {
+      applyOrderStatus(data);
+    } else if (data.type === 'chat_reply') {
+      // Открытый чат этой машины и так показывает сообщение; openChatCarId
+      // выставляет страница с чатом (home.html, main.js), на прочих его нет
+      if (window.openChatCarId != data.car_id) {
+        showUserNotification(`${data.username} ответил по ${data.car}: ${data.message}`);
+      }
+    } else if (data.type === 'price_drop') {
+      showUserNotification(`${data.car} подешевел: ${data.old_price} → ${data.price} ₽`);
+    } else if (data.type === 'back_in_stock') {
+      showUserNotification(`${data.car} снова в наличии: ${data.price} ₽`);
+    }
+  };
+
+  userSocket.onclose = function (e) {
+    clearInterval(heartbeatTimer);
+    setTimeout(connectUserNotifications, 5000); // Переподключение
+  };
+}
+
+document.addEventListener('DOMContentLoaded', connectUserNotifications);
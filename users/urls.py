@@ -1,9 +1,11 @@
 from django.urls import path
+from django.views.generic import RedirectView
 from . import views
 
 urlpatterns = [
     path("register/", views.register, name="register"),
     path("login/", views.user_login, name="login"),
     path("logout/", views.user_logout, name="logout"),
-    path("profile/", views.profile, name="profile"),
+    # Профиль один — core.views.profile; старый адрес ведёт туда же
+    path("profile/", RedirectView.as_view(pattern_name="profile", permanent=True)),
 ]
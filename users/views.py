@@ -1,6 +1,5 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth import login, authenticate, logout
-from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from .forms import UserRegisterForm
 
@@ -38,8 +37,3 @@ def user_logout(request):
     logout(request)
     messages.info(request, "Вы вышли из аккаунта.")
     return redirect("home")
-
-
-@login_required
-def profile(request):
-    return render(request, "users/profile.html")